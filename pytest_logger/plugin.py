@@ -1,14 +1,27 @@
 import os
 import sys
+import io
+import copy
+import codecs
+import tempfile
+import collections
+import functools
+import json
 import re
 import pytest
 import logging
+import threading
 import time
 import datetime
 import argparse
 import shutil
+import glob
+import struct
 from pathlib import Path
 
+# modules used only by optional features, which pytest doesn't import itself,
+# are imported where they're needed, so that they don't add to startup time of every pytest run
+
 
 def pytest_addhooks(pluginmanager):
     pluginmanager.add_hookspecs(LoggerHookspec)
@@ -21,13 +34,31 @@ def _late_addoptions(parser, logcfg):
         help='base directory with log files for file loggers [basetemp]',
         default=None,
     )
+    parser.addini(
+        name='logger_keep_runs',
+        help='number of previous logs directories kept when logsdir is given [0]',
+        default=None,
+    )
     group = parser.getgroup('logger')
     group.addoption('--logger-logsdir',
                     help='pick you own logs directory instead of default '
                          'directory under session tmpdir')
+    group.addoption('--logger-keep-runs',
+                    type=int,
+                    metavar='K',
+                    help='keep logs directories of K previous runs as <logsdir>.1 ... <logsdir>.K, '
+                         'instead of removing previous logs directory')
+    group.addoption('--logger-stats',
+                    type=int,
+                    default=0,
+                    metavar='N',
+                    help='measure logging overhead and show N most expensive tests and loggers')
+    group.addoption('--logger-stats-json',
+                    metavar='PATH',
+                    help='measure logging overhead and write it to JSON file')
 
     if logcfg._enabled:
-        parser = _log_option_parser(logcfg._loggers)
+        parser = _log_option_parser(logcfg._loggers, logcfg._index)
         group.addoption('--loggers',
                         default=parser(logcfg._log_option_default),
                         type=parser,
@@ -65,38 +96,250 @@ class LoggerPlugin:
         self._loggers = _loggers_from_logcfg(logcfg, config.getoption('loggers')) if logcfg._enabled else None
         self._formatter_class = logcfg._formatter_class or DefaultFormatter
         self._logsdir = None
+        self._xdist_worker = hasattr(config, 'workerinput')
+        self._xdist_controller = not self._xdist_worker and getattr(config.option, 'dist', 'no') != 'no'
+        self._stats = collections.Counter()
+        self._workers_stats = {}
+        self._index_filename = logcfg._index_filename
+        self._index = []
         self._split_by_outcome_subdir = logcfg._split_by_outcome_subdir
         self._split_by_outcome_outcomes = logcfg._split_by_outcome_outcomes
-
-    def logsdir(self):
-        ldir = self._logsdir
-        if ldir:
-            return ldir
+        self._split_by_outcome_deferred = logcfg._split_by_outcome_deferred
+        self._split_by_outcome_threads = logcfg._split_by_outcome_threads
+        self._outcome_links = set()
+        self._keep_logs_outcomes = logcfg._keep_logs_outcomes
+        self._keep_logs_capacity = logcfg._keep_logs_capacity
+        self._keep_logs_deferred_formatting = logcfg._keep_logs_deferred_formatting
+        self._logger_limits = logcfg._logger_limits
+        self._test_limits = logcfg._test_limits
+        self._tail_size = logcfg._tail_size
+        self._compression = logcfg._file_compression
+        # compression happens in the thread which writes, so it's moved out of test thread
+        self._writer = _AsyncFileWriter() if logcfg._async_file_handlers or self._compression else None
+        self._made_dirs = set()
+        self._lazy_logdirs = logcfg._lazy_logdirs
+        self._archive_filename = logcfg._archive_filename
+        self._archive = None
+        self._new_file_handler = _FileHandler
+        if self._archive_filename:
+            # compression is applied to archive segments, not to handlers' spools
+            self._new_file_handler = functools.partial(_FileHandler, spool=True, binary=logcfg._binary_logs)
+        elif logcfg._file_buffer_size or self._compression or self._lazy_logdirs or logcfg._binary_logs:
+            self._new_file_handler = functools.partial(_FileHandler, buffer_size=logcfg._file_buffer_size,
+                                                       compression=self._compression,
+                                                       make_dir=self.make_dir if self._lazy_logdirs else None,
+                                                       binary=logcfg._binary_logs)
+        self._pool = None
+        if logcfg._handler_pooling:
+            self._pool = _HandlerPool(self._formatter_class(), self._new_file_handler)
+        self._dispatch = _Dispatch() if logcfg._handler_dispatch else None
+        self._level_gating = logcfg._level_gating
+        self._hook_loggers_scope = logcfg._hook_loggers_scope
+        self._hook_loggers = {}
+        self._keep_runs = int(config.getoption('logger_keep_runs', None) or config.getini('logger_keep_runs') or 0)
+        self._remover = None
+        self._stats_top = config.getoption('logger_stats', 0)
+        self._stats_json = config.getoption('logger_stats_json', None)
+        self._instrumentation = _Instrumentation() if self._stats_top or self._stats_json else None
+        self._root_enabler = None
+        if self._dispatch and self._loggers:
+            # loggers don't change between tests, so the logging setup is done once for the session
+            self._dispatch.install(logging.getLogger(name) for name, _ in self._loggers.stdout + self._loggers.file)
+            self._root_enabler = _make_root_enabler(self._loggers.stdout, self._loggers.file, logcfg._level_gating)
+            self._root_enabler.enable()
+
+    def pytest_unconfigure(self, config):
+        if self._root_enabler:
+            self._root_enabler.disable()
+        if self._dispatch:
+            self._dispatch.uninstall()
+        if self._writer:
+            self._writer.stop()
+        if self._pool:
+            self._pool.close()
+        if self._remover:
+            self._remover.shutdown(wait=True)
+
+    def pytest_sessionstart(self, session):
+        if self._xdist_controller and (self._logdirlinks or self._logsdir_option()):
+            # prepared once for all workers, which neither clean it up nor link it
+            self.logsdir()
+
+    def pytest_sessionfinish(self, session):
+        if self._archive:
+            self._archive.close()
+        if self._outcome_links:
+            self._make_outcome_links(sorted(self._outcome_links), self._split_by_outcome_threads)
+            self._outcome_links.clear()
+        if self._xdist_worker:
+            self._config.workeroutput['pytest_logger_stats'] = dict(self._stats)
+            self._config.workeroutput['pytest_logger_index'] = self._index
+            if self._instrumentation:
+                self._config.workeroutput['pytest_logger_instrumentation'] = self._instrumentation.to_json()
+            return
+        if self._stats_json:
+            with open(self._stats_json, 'w') as f:
+                json.dump(self._instrumentation.to_json(), f, indent=1)
+        if self._index:
+            with open(os.path.join(str(self.logsdir()), self._index_filename), 'w') as f:
+                for entry in self._index:
+                    f.write(json.dumps(entry))
+                    f.write('\n')
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        stats = getattr(node, 'workeroutput', {}).get('pytest_logger_stats')
+        if stats:
+            self._workers_stats[node.workerinput['workerid']] = stats
+        self._index += getattr(node, 'workeroutput', {}).get('pytest_logger_index', [])
+        instrumentation = getattr(node, 'workeroutput', {}).get('pytest_logger_instrumentation')
+        if instrumentation:
+            self._instrumentation.merge(instrumentation)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self._workers_stats and terminalreporter.verbosity > 0:
+            files = sum(stats.get('files', 0) for stats in self._workers_stats.values())
+            size = sum(stats.get('bytes', 0) for stats in self._workers_stats.values())
+            terminalreporter.write_line('pytest-logger: %s log files, %s bytes written by %s workers'
+                                        % (files, size, len(self._workers_stats)))
+        if self._stats_top:
+            terminalreporter.write_sep('=', 'pytest-logger overhead')
+            for line in self._instrumentation.summary(self._stats_top):
+                terminalreporter.write_line(line)
+
+    def _logsdir_option(self):
         logger_logsdir = self._config.getoption('logger_logsdir')
         if not logger_logsdir:
             logger_logsdir = self._config.getini('logger_logsdir')
         if not logger_logsdir:
             logger_logsdir = self._config.hook.pytest_logger_logsdir(config=self._config)
+        return logger_logsdir
+
+    def logsdir(self):
+        ldir = self._logsdir
+        if ldir:
+            return ldir
+        logger_logsdir = self._logsdir_option()
         if logger_logsdir:
-            ldir = _make_logsdir_dir(logger_logsdir)
+            ldir = _make_logsdir_dir(logger_logsdir, cleanup=not self._xdist_worker,
+                                     keep_runs=self._keep_runs, remove=self._remove_later)
         else:
             ldir = _make_logsdir_tmpdir(self._config._tmpdirhandler)
 
         self._logsdir = ldir
 
-        for link in self._logdirlinks:
-            _refresh_link(str(ldir), link)
+        if not self._xdist_worker:
+            for link in self._logdirlinks:
+                _refresh_link(str(ldir), link)
 
         return ldir
 
+    def _remove_later(self, path):
+        """Removes directory in background thread, joined at the end of session."""
+        if not self._remover:
+            import concurrent.futures
+            self._remover = concurrent.futures.ThreadPoolExecutor(1)
+        self._remover.submit(_rmtree, path)
+
+    def archive(self):
+        if not self._archive:
+            filename = self._archive_filename
+            if self._xdist_worker:
+                root, ext = os.path.splitext(filename)
+                filename = '%s-%s%s' % (root, self._config.workerinput['workerid'], ext)
+            if self._compression:
+                filename += self._compression.suffix
+            self._archive = _Archive(os.path.join(str(self.logsdir()), filename), self._compression)
+        return self._archive
+
+    def make_dir(self, path):
+        """Creates directory with parents, remembering them to avoid further filesystem lookups."""
+        path = str(path)
+        if path in self._made_dirs:
+            return
+        parent = os.path.dirname(path)
+        if parent in self._made_dirs:
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                pass
+            except FileNotFoundError:  # removed meanwhile
+                os.makedirs(path, exist_ok=True)
+        else:
+            os.makedirs(path, exist_ok=True)
+            while parent and parent not in self._made_dirs:
+                self._made_dirs.add(parent)
+                parent, previous = os.path.dirname(parent), parent
+                if parent == previous:
+                    break
+        self._made_dirs.add(path)
+
+    def _make_outcome_links(self, links, threads=0):
+        """Makes links to test directories in split by outcome directory.
+
+        :param links: (outcome, nodepath) pairs, sorted to have directories made once
+        """
+        split_by_outcome_logdir = os.path.join(str(self._logsdir), self._split_by_outcome_subdir)
+        jobs = []
+        for outcome, nodepath in links:
+            outcomedir = os.path.join(split_by_outcome_logdir, outcome, os.path.dirname(nodepath))
+            self.make_dir(outcomedir)
+            destdir_relpath = os.path.relpath(os.path.join(str(self._logsdir), nodepath), outcomedir)
+            jobs.append((destdir_relpath, os.path.join(split_by_outcome_logdir, outcome, nodepath)))
+        if threads:
+            import concurrent.futures
+            with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+                for _ in executor.map(lambda job: _refresh_link(*job), jobs):
+                    pass
+        else:
+            for job in jobs:
+                _refresh_link(*job)
+
+    def add_files(self, item, outcome, files):
+        """Accounts log files written for a test.
+
+        :param files: (name, path, size, level_counts) tuples, size is taken from file if None,
+            files which don't exist are skipped
+        """
+        if not (self._xdist_worker or self._index_filename or self._instrumentation):
+            return
+        entries = []
+        for name, path, size, level_counts in files:
+            if size is None:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+            self._stats['files'] += 1
+            self._stats['bytes'] += size
+            entries.append({'name': name, 'bytes': size, 'levels': dict(level_counts or {})})
+        if self._instrumentation:
+            self._instrumentation.test(item.nodeid)['bytes'] += sum(entry['bytes'] for entry in entries)
+        if self._index_filename:
+            self._index.append({'nodeid': item.nodeid, 'dir': _item_nodepath(item),
+                                'outcome': outcome, 'files': entries})
+
     def pytest_runtest_setup(self, item):
-        loggers = _choose_loggers(self._loggers, _loggers_from_hooks(item))
-        formatter = self._formatter_class()
+        start = time.perf_counter()
+        loggers = _choose_loggers(self._loggers, self._loggers_from_hooks(item))
+        formatter = self._pool.restart_formatter() if self._pool else self._formatter_class()
         item._logger = state = LoggerState(item=item,
                                            stdoutloggers=loggers.stdout,
                                            fileloggers=loggers.file,
-                                           formatter=formatter)
+                                           formatter=formatter,
+                                           plugin=self)
         state.on_setup()
+        if self._instrumentation:
+            self._instrumentation.test(item.nodeid)['setup'] += time.perf_counter() - start
+
+    def _loggers_from_hooks(self, item):
+        if not self._hook_loggers_scope:
+            return _loggers_from_hooks(item)
+        key = _scope_nodeid(item, self._hook_loggers_scope)
+        loggers = self._hook_loggers.get(key)
+        if loggers is None:
+            loggers = self._hook_loggers[key] = _loggers_from_hooks(item)
+        return loggers
 
     def pytest_runtest_teardown(self, item, nextitem):
         logger = getattr(item, '_logger', None)
@@ -108,24 +351,51 @@ class LoggerPlugin:
         report = yield
         logger = getattr(item, '_logger', None)
         if logger:
-            if self._logsdir and self._split_by_outcome_subdir and report.outcome in self._split_by_outcome_outcomes:
-                split_by_outcome_logdir = self._logsdir / self._split_by_outcome_subdir / report.outcome
-                nodeid = _sanitize_nodeid(item.nodeid)
-                nodepath = os.path.dirname(nodeid)
-                outcomedir = split_by_outcome_logdir / nodepath
-                outcomedir.mkdir(parents=True, exist_ok=True)
-                destdir_relpath = os.path.relpath(self._logsdir / nodeid, outcomedir)
-                _refresh_link(destdir_relpath, split_by_outcome_logdir / nodeid)
+            logger.on_report(report)
             if call.when == 'teardown':
+                start = time.perf_counter()
                 logger.on_makereport()
+                if logger.split_outcomes:
+                    self._link_by_outcome(item, logger.split_outcomes)
+                if self._instrumentation:
+                    self._instrumentation.test(item.nodeid)['teardown'] += time.perf_counter() - start
         return report
 
+    def _link_by_outcome(self, item, outcomes):
+        """Links test's directory in split by outcome directory, unless no directory was made,
+        e.g. when test's logs were discarded, archived or nothing was logged to lazy directory."""
+        if not self._logsdir:
+            return
+        logdir = str(_logdir_path(item))
+        # lazily made directories are remembered by absolute paths of their files
+        if logdir not in self._made_dirs and os.path.abspath(logdir) not in self._made_dirs:
+            return
+        links = [(outcome, _item_nodepath(item)) for outcome in outcomes]
+        if self._split_by_outcome_deferred:
+            self._outcome_links.update(links)
+        else:
+            self._make_outcome_links(links)
+
 
 class LoggerState:
-    def __init__(self, item, stdoutloggers, fileloggers, formatter):
+    def __init__(self, item, stdoutloggers, fileloggers, formatter, plugin):
         self._put_newlines = bool(item.config.option.capture == 'no' and stdoutloggers)
-        self.handlers = _make_handlers(stdoutloggers, fileloggers, item, formatter)
-        self.root_enabler = RootEnabler(bool(stdoutloggers and fileloggers))
+        self._writer = plugin._writer
+        self._pool = plugin._pool
+        self._dispatch = plugin._dispatch
+        self._plugin = plugin
+        self._item = item
+        self._keep_logs_outcomes = plugin._keep_logs_outcomes
+        self._keep_logs = False
+        self._in_logdir = False
+        self._outcome = 'passed'
+        self._split_outcomes = plugin._split_by_outcome_outcomes
+        self.split_outcomes = []  # outcomes of test's phases, by which its directory is linked
+        self.handlers = _make_handlers(stdoutloggers, fileloggers, item, formatter, plugin)
+        if plugin._index_filename:
+            for hdlr in _file_handlers(self.handlers):
+                hdlr.level_counts = collections.Counter()
+        self.root_enabler = _make_root_enabler(stdoutloggers, fileloggers, plugin._level_gating)
 
     def put_newline(self):
         if self._put_newlines:
@@ -133,15 +403,97 @@ class LoggerState:
 
     def on_setup(self):
         self.put_newline()
-        _enable(self.handlers)
+        if self._dispatch:
+            self._dispatch.enable(self.handlers)
+        else:
+            _enable(self.handlers)
         self.root_enabler.enable()
 
     def on_teardown(self):
         self.put_newline()
 
+    def keep_logs(self):
+        self._keep_logs = True
+
+    def materialize_logdir(self):
+        """Writes logs spooled so far to test's directory, when it's requested in archive mode.
+        At the end of test its logs are written there again, complete, instead of to archive.
+        """
+        self._in_logdir = True
+        logdir = _make_logdir(self._item)
+        if self._writer:
+            self._writer.flush()
+        for hdlr in _file_handlers(self.handlers):
+            if isinstance(hdlr, _FileHandler):
+                _write_spool(hdlr, logdir, self._plugin._compression)
+        return logdir
+
+    def on_report(self, report):
+        if report.outcome in self._split_outcomes and report.outcome not in self.split_outcomes:
+            self.split_outcomes.append(report.outcome)
+        if report.outcome in self._keep_logs_outcomes:
+            self._keep_logs = True
+        if report.failed or (report.skipped and self._outcome == 'passed'):
+            self._outcome = report.outcome
+
     def on_makereport(self):
         self.root_enabler.disable()
-        _disable(self.handlers)
+        if self._dispatch:
+            self._dispatch.disable()
+        else:
+            _disable(self.handlers)
+        if self._writer:
+            self._writer.flush()  # per-test files are complete before report is finalized
+        files = self._save_files()
+        for hdlr in self.handlers:
+            formatter = _unwrap(hdlr).formatter
+            if isinstance(formatter, _FormatOnceFormatter):
+                formatter.forget()
+                break  # shared by all handlers of test
+        if self._pool:
+            self._pool.put(self.handlers)
+        else:
+            _close(self.handlers)
+        self.handlers = []  # state stays referenced by item till session end
+        if files:
+            self._plugin.add_files(self._item, self._outcome, files)
+
+    def _save_files(self):
+        """Writes logs held by handlers to logs directory or archive.
+
+        :return list: (name, path, size, level_counts) of log files
+        """
+        archive = self._plugin.archive() if self._plugin._archive_filename and not self._in_logdir else None
+        logdir = None
+        files = []
+        for hdlr in _file_handlers(self.handlers):
+            if isinstance(hdlr, _FileHandler):
+                hdlr.write_tail()
+            if isinstance(hdlr, _RingBufferHandler):
+                if not (self._keep_logs and hdlr.records):
+                    continue
+                if archive:
+                    data = io.BytesIO(''.join(hdlr.lines()).encode('utf-8'))
+                    size = archive.append(self._item, hdlr.filename, data)
+                    files.append((hdlr.filename, None, size, hdlr.level_counts))
+                else:
+                    logdir = logdir or _make_logdir(self._item)
+                    path = _write_logfile(str(logdir / hdlr.filename), hdlr.lines(), self._plugin._compression)
+                    files.append((os.path.basename(path), path, None, hdlr.level_counts))
+            elif archive:
+                spool = hdlr.spool()
+                if spool:
+                    name = os.path.basename(hdlr.baseFilename)
+                    size = archive.append(self._item, name, spool)
+                    files.append((name, None, size, hdlr.level_counts))
+            elif self._in_logdir:
+                logdir = logdir or _make_logdir(self._item)
+                path = _write_spool(hdlr, logdir, self._plugin._compression)
+                if path:
+                    files.append((os.path.basename(path), path, None, hdlr.level_counts))
+            else:
+                files.append((os.path.basename(hdlr.baseFilename), hdlr.baseFilename, None, hdlr.level_counts))
+        return files
 
 
 class RootEnabler:
@@ -152,13 +504,50 @@ class RootEnabler:
     def enable(self):
         if self._enabled:
             self._root_level = logging.root.level
-            logging.root.setLevel(logging.NOTSET)  # stops root logger from blocking logs
+            if self._root_level != logging.NOTSET:
+                logging.root.setLevel(logging.NOTSET)  # stops root logger from blocking logs
 
     def disable(self):
-        if self._enabled:
+        # setting level clears level caches of all loggers, hence it's done only when needed
+        if self._enabled and logging.root.level != self._root_level:
             logging.root.setLevel(self._root_level)
 
 
+class LevelGate:
+    """Used instead of `RootEnabler` when level gating is on. Rather than letting
+    all records through root logger, sets each handled logger's level to the lowest
+    level of handlers its records reach, so that records consumed by no handler
+    are rejected before they're created.
+    """
+
+    def __init__(self, enabled, loggers):
+        self._enabled = enabled
+        self._loggers = loggers
+        self._saved_levels = []
+
+    def enable(self):
+        if not self._enabled:
+            return
+        handler_levels = {}
+        for name, level in self._loggers:
+            logger = logging.getLogger(name)
+            handler_levels[logger] = min(level, handler_levels.get(logger, level))
+        # levels are computed before any is set, as they depend on levels of parents
+        levels = [(logger, max(_lowest_handler_level(logger, handler_levels), _inherited_level(logger), 1))
+                  for logger in handler_levels
+                  if logger is logging.root or logger.level == logging.NOTSET]
+        self._saved_levels = [(logger, logger.level) for logger, _ in levels]
+        for logger, level in levels:
+            if logger.level != level:
+                logger.setLevel(level)
+
+    def disable(self):
+        for logger, level in reversed(self._saved_levels):
+            if logger.level != level:
+                logger.setLevel(level)
+        self._saved_levels = []
+
+
 class Loggers:
     def __init__(self, stdout, file_):
         self.stdout = stdout
@@ -174,12 +563,33 @@ class LoggerConfig:
     def __init__(self):
         self._enabled = False
         self._loggers = []
+        self._index = _LoggerIndex()
         self._formatter_class = None
         self._log_option_default = ''
         self._split_by_outcome_subdir = None
         self._split_by_outcome_outcomes = []
-
-    def add_loggers(self, loggers, stdout_level=logging.NOTSET, file_level=logging.NOTSET):
+        self._split_by_outcome_deferred = False
+        self._split_by_outcome_threads = 0
+        self._async_file_handlers = False
+        self._handler_pooling = False
+        self._handler_dispatch = False
+        self._level_gating = False
+        self._file_buffer_size = 0
+        self._keep_logs_outcomes = []
+        self._keep_logs_capacity = None
+        self._keep_logs_deferred_formatting = False
+        self._file_compression = None
+        self._lazy_logdirs = False
+        self._index_filename = None
+        self._archive_filename = None
+        self._binary_logs = False
+        self._logger_limits = {}
+        self._test_limits = None
+        self._tail_size = 64 * 1024
+        self._hook_loggers_scope = None
+
+    def add_loggers(self, loggers, stdout_level=logging.NOTSET, file_level=logging.NOTSET,
+                    max_bytes=None, max_records=None):
         """Adds loggers for stdout/filesystem handling.
 
         Stdout: loggers will log to stdout only when mentioned in `loggers` option. If they're
@@ -194,9 +604,20 @@ class LoggerConfig:
 
         :arg file_level: Level at which filesystem handlers will pass logs.
            By default: `logging.NOTSET`, which means: pass everything.
+
+        :arg max_bytes: Size of logs which file handlers write per test, the rest is dropped
+           except for a tail, see `set_log_limits`. By default: unlimited.
+
+        :arg max_records: Number of logs which file handlers write per test,
+           as with `max_bytes`. By default: unlimited.
         """
         self._enabled = True
-        self._loggers.append((loggers, _sanitize_level(stdout_level), _sanitize_level(file_level)))
+        row = (loggers, _sanitize_level(stdout_level), _sanitize_level(file_level))
+        self._loggers.append(row)
+        self._index.add(row)
+        if max_bytes is not None or max_records is not None:
+            for name in loggers:
+                self._logger_limits[name] = (max_bytes, max_records)
 
     def set_formatter_class(self, formatter_class):
         """Sets the `logging.Formatter` class to be used by all loggers.
@@ -214,22 +635,175 @@ class LoggerConfig:
         """ Sets default value of `log` option."""
         self._log_option_default = value
 
-    def split_by_outcome(self, outcomes=None, subdir='by_outcome'):
+    def split_by_outcome(self, outcomes=None, subdir='by_outcome', deferred=False, threads=0):
         """Makes a directory inside main logdir where logs are further split by test outcome
 
         :param outcomes: list of test outcomes to be handled (failed/passed/skipped)
         :param subdir: name for the subdirectory in main log directory
+        :param deferred: if True, outcomes are only recorded during the session and the whole
+            directory is made at its end, instead of after each test
+        :param threads: number of threads making links at the end of session,
+            if 0 - links are made in the main thread
         """
         if outcomes is not None:
-            allowed_outcomes = ['passed', 'failed', 'skipped']
-            unexpected_outcomes = set(outcomes) - set(allowed_outcomes)
-            if unexpected_outcomes:
-                raise ValueError('got unexpected_outcomes: <' + str(list(unexpected_outcomes)) + '>')
+            _check_outcomes(outcomes)
             self._split_by_outcome_outcomes = outcomes
         else:
             self._split_by_outcome_outcomes = ['failed']
 
         self._split_by_outcome_subdir = subdir
+        self._split_by_outcome_deferred = deferred
+        self._split_by_outcome_threads = threads
+
+    def set_async_file_handlers(self, enabled=True):
+        """Makes file loggers hand records over to a background writer thread,
+        which owns log files, instead of writing them in test thread.
+
+        Files of given test are guaranteed to be complete once its teardown report is made.
+
+        :param enabled: whether file loggers should write asynchronously
+        """
+        self._async_file_handlers = enabled
+
+    def set_handler_pooling(self, enabled=True):
+        """Makes handlers and formatter live for the whole session. Instead of being
+        constructed for each test, they are taken from pool and pointed at test's log files.
+
+        Formatter class needs to be reusable between tests.
+
+        :param enabled: whether handlers should be pooled
+        """
+        self._handler_pooling = enabled
+
+    def set_handler_dispatch(self, enabled=True):
+        """Makes each handled logger get a single handler for the whole session, which passes
+        records to handlers of currently running test. Switching between tests doesn't add
+        nor remove handlers of loggers then.
+
+        :param enabled: whether session-wide dispatching handlers should be used
+        """
+        self._handler_dispatch = enabled
+
+    def set_level_gating(self, enabled=True):
+        """Changes the way in which plugin lets logs through loggers. Instead of setting
+        root logger level to NOTSET, each handled logger gets the lowest level of handlers
+        its logs reach. Logs, which no handler would consume, aren't even created.
+
+        :param enabled: whether levels of handled loggers should be set
+        """
+        self._level_gating = enabled
+
+    def set_file_buffer_size(self, size):
+        """Makes file loggers buffer their output instead of flushing it to disk after each log.
+        Buffer is flushed when it gets full, on logs of ERROR level or higher and at the end of test.
+
+        :param size: buffer size in bytes, e.g. 65536. Zero disables buffering.
+        """
+        self._file_buffer_size = size
+
+    def keep_logs_by_outcome(self, outcomes=None, capacity=100000, deferred_formatting=False):
+        """Makes file loggers hold logs in memory and write them to logs directory
+        only for tests with given outcomes, or using `logdir` fixture.
+        Test directory isn't created for other tests.
+
+        :param outcomes: list of test outcomes to be handled (failed/passed/skipped),
+            ['failed'] by default. Logs are kept if any of test's phases has one of these outcomes.
+        :param capacity: number of last logs held in memory per logger, older ones are dropped.
+        :param deferred_formatting: hold records instead of formatted logs, so that only logs
+            which are written get formatted. Messages which aren't strings or have arguments other
+            than numbers and strings are rendered when logged, in case they're mutated later.
+        """
+        if outcomes is not None:
+            _check_outcomes(outcomes)
+            self._keep_logs_outcomes = outcomes
+        else:
+            self._keep_logs_outcomes = ['failed']
+        self._keep_logs_capacity = capacity
+        self._keep_logs_deferred_formatting = deferred_formatting
+
+    def set_file_compression(self, method='gzip', level=None):
+        """Makes file loggers write compressed files, suffixed with ".gz" or ".zst".
+        Compression is done in a background thread, as with `set_async_file_handlers`,
+        except for logs written at the end of test (kept in memory with `keep_logs_by_outcome`
+        or appended to archive), which are compressed in test thread when test's files are completed.
+
+        :param method: "gzip" or "zstd", the latter requires `zstandard` package.
+        :param level: compression level, by default: 6 for gzip and 3 for zstd.
+        """
+        self._file_compression = _Compression(method, level)
+
+    def set_lazy_logdirs(self, enabled=True):
+        """Makes test's log directory created only when the first log is written to one of its files,
+        instead of at test setup. Tests which don't log get no directory (unless they use
+        the `logdir` fixture).
+
+        :param enabled: whether log directories should be created lazily
+        """
+        self._lazy_logdirs = enabled
+
+    def set_index_file(self, filename='index.jsonl'):
+        """Makes plugin write an index of logs at the end of session, placed in logs directory.
+        Each line of index is a JSON object describing a test: its `nodeid`, `dir` (relative to
+        logs directory), `outcome` and `files` with their `name`, size in `bytes` and
+        number of logs per level (`levels`).
+
+        :param filename: name of index file
+        """
+        self._index_filename = filename
+
+    def set_archive(self, filename='logs.archive'):
+        """Makes file loggers of all tests write to a single archive file in logs directory,
+        instead of separate files in per-test directories. Archive is accompanied by
+        an index file (with ".idx" suffix) mapping tests' log files to archive's byte ranges.
+        Logs of tests using `logdir` fixture are written to their directories instead:
+        logged before fixture is set up when it is, and all of them at the end of test.
+        Only these tests are linked by `split_by_outcome`, others have no directories.
+
+        :param filename: name of archive file, with pytest-xdist worker id appended
+            to its stem in worker processes
+        """
+        self._archive_filename = filename
+
+    def set_binary_logs(self, enabled=True):
+        """Makes file loggers write records in compact binary format, instead of formatting them.
+        Files get ".bin" suffix and can be rendered to text with `python -m pytest_logger.reader`.
+        Formatter class is used only for formatting exceptions. Logs kept in memory
+        with `keep_logs_by_outcome` are still written as text.
+
+        :param enabled: whether file loggers should write binary records
+        """
+        self._binary_logs = enabled
+
+    def set_log_limits(self, max_bytes=None, max_records=None, tail_size=64 * 1024):
+        """Limits logs written by file loggers per test, in total. Once a limit (this one, or
+        one of logger given to `add_loggers`) is exceeded, logger's file gets no more logs
+        until the end of test, when last logs are appended preceded by a line counting dropped ones.
+        Limits don't apply to logs kept in memory with `keep_logs_by_outcome`.
+
+        :param max_bytes: size of logs written per test, in bytes of binary logs
+            or characters of text logs. By default: unlimited.
+        :param max_records: number of logs written per test. By default: unlimited.
+        :param tail_size: size of last logs written at the end of test, per logger file.
+        """
+        if max_bytes is not None or max_records is not None:
+            self._test_limits = (max_bytes, max_records)
+        else:
+            self._test_limits = None
+        self._tail_size = tail_size
+
+    def set_hook_loggers_scope(self, scope='module'):
+        """Makes loggers returned by `pytest_logger_stdoutloggers` and `pytest_logger_fileloggers`
+        hooks computed once per scope, instead of for each test. Hooks are called for the first test
+        of scope, the following ones get the same loggers. Scope applies to all implementations
+        of these hooks, they can't declare scopes of their own.
+
+        :param scope: "session", "module" or "class" (tests outside of classes share
+            loggers per module), None calls hooks for each test
+        """
+        if scope not in _hook_loggers_scopes:
+            raise ValueError('got unexpected scope: <%s>, expected one of: %s'
+                             % (scope, ', '.join(str(x) for x in _hook_loggers_scopes)))
+        self._hook_loggers_scope = scope
 
 
 class LoggerHookspec:
@@ -304,6 +878,18 @@ class DefaultFormatter(logging.Formatter):
     def __init__(self):
         logging.Formatter.__init__(self, DefaultFormatter.format_string)
         self._start = time.time()
+        self._level_names = dict(DefaultFormatter.short_level_names)
+        # seconds and formatted minutes and seconds, replaced at once, as handlers
+        # of a test may share the formatter across threads
+        self._cached_time = (None, None)
+        # subclasses customizing time or message format need to go through the generic path
+        self._fast = (type(self).formatTime is DefaultFormatter.formatTime and
+                      type(self).formatMessage is logging.Formatter.formatMessage)
+
+    def restart(self):
+        """Makes timestamps relative to the current time again."""
+        self._start = time.time()
+        self._cached_time = (None, None)
 
     def formatTime(self, record, datefmt=None):
         ct = record.created - self._start
@@ -311,26 +897,84 @@ class DefaultFormatter(logging.Formatter):
         return dt.strftime("%M:%S.%f")[:-3]  # omit useconds, leave mseconds
 
     def format(self, record):
-        record.levelshortname = DefaultFormatter.short_level_names.get(record.levelno,
-                                                                       'l%s' % record.levelno)
-        return logging.Formatter.format(self, record)
+        levelshortname = self._level_names.get(record.levelno)
+        if levelshortname is None:
+            levelshortname = self._level_names[record.levelno] = sys.intern('l%s' % record.levelno)
+        record.levelshortname = levelshortname
+        if not self._fast or self._style._fmt != DefaultFormatter.format_string:
+            # format string can be replaced after __init__
+            return logging.Formatter.format(self, record)
+
+        # equivalent of generic path: time is rounded to useconds and truncated to mseconds
+        msecs = round((record.created - self._start) * 1e6) // 1000
+        seconds, msecs = divmod(msecs, 1000)
+        cached_seconds, cached_time = self._cached_time
+        if seconds != cached_seconds:
+            cached_time = '%02d:%02d.' % divmod(seconds % 3600, 60)
+            self._cached_time = (seconds, cached_time)
+        record.message = record.getMessage()
+        s = '%s%03d %s %s: %s' % (cached_time, msecs, levelshortname, record.name, record.message)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if s[-1:] != '\n':
+                s = s + '\n'
+            s = s + record.exc_text
+        if record.stack_info:
+            if s[-1:] != '\n':
+                s = s + '\n'
+            s = s + self.formatStack(record.stack_info)
+        return s
 
 
 @pytest.fixture
 def logdir(request):
     """ Return a path to log directory for the test function """
-    return _make_logdir(request._pyfuncitem)
+    item = request._pyfuncitem
+    logger = getattr(item, '_logger', None)
+    if logger and logger._plugin._keep_logs_outcomes:
+        logger.keep_logs()
+    if logger and logger._plugin._archive_filename:
+        return logger.materialize_logdir()
+    return _make_logdir(item)
+
+
+_dashes_re = re.compile(r'-+')
+_params_re = re.compile(r'\[(.+)\]')
 
 
 def _sanitize_nodeid(node_id):
     tokens = node_id.split('::')
-    tokens[-1] = tokens[-1].replace('/', '-')
-    tokens[-1] = re.sub(r'-+', '-', tokens[-1])
+    last = tokens[-1]
+    if '/' in last:
+        last = last.replace('/', '-')
+    if '--' in last:
+        last = _dashes_re.sub('-', last)
+    tokens[-1] = last
     node_id = '/'.join([x for x in tokens if x != '()'])
-    node_id = re.sub(r'\[(.+)\]', r'-\1', node_id)
+    if '[' in node_id:
+        node_id = _params_re.sub(r'-\1', node_id)
     return node_id
 
 
+def _item_nodepath(item):
+    """Item's sanitized nodeid, i.e. path of its log directory relative to logs directory.
+    It's needed in several hooks, so it's computed once per item."""
+    try:
+        return item._logger_nodepath
+    except AttributeError:
+        item._logger_nodepath = nodepath = _sanitize_nodeid(item.nodeid)
+        return nodepath
+
+
+def _check_outcomes(outcomes):
+    allowed_outcomes = ['passed', 'failed', 'skipped']
+    unexpected_outcomes = set(outcomes) - set(allowed_outcomes)
+    if unexpected_outcomes:
+        raise ValueError('got unexpected_outcomes: <' + str(list(unexpected_outcomes)) + '>')
+
+
 def _sanitize_level(level, raises=True):
     if isinstance(level, str):
         try:
@@ -364,16 +1008,62 @@ def _make_logsdir_tmpdir(tmpdirhandler):
     return Path(logsdir)
 
 
-def _make_logsdir_dir(dstname):
-    shutil.rmtree(dstname, ignore_errors=True)
-    os.mkdir(dstname)
+def _make_logsdir_dir(dstname, cleanup=True, keep_runs=0, remove=None):
+    """Makes logs directory. With `cleanup` existing directory is renamed, to be either
+    removed with `remove` (by default: right away) or kept as one of `keep_runs`
+    previous directories: "<dstname>.1" (the latest) to "<dstname>.<keep_runs>".
+    """
+    if cleanup:
+        dstname = os.path.normpath(str(dstname))
+        remove = remove or _rmtree
+        for leftover in glob.glob(glob.escape(dstname) + _REMOVED_INFIX + '*'):  # of interrupted sessions
+            remove(leftover)
+        if keep_runs:
+            _remove_aside('%s.%s' % (dstname, keep_runs), remove)
+            for index in range(keep_runs - 1, 0, -1):
+                _rename_if_exists('%s.%s' % (dstname, index), '%s.%s' % (dstname, index + 1))
+            _rename_if_exists(dstname, dstname + '.1')
+        else:
+            _remove_aside(dstname, remove)
+    os.makedirs(dstname, exist_ok=True)
     return Path(dstname)
 
 
-def _make_logdir(item):
+_REMOVED_INFIX = '.removed-'
+
+
+def _rmtree(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _rename_if_exists(src, dst):
+    try:
+        os.rename(src, dst)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_aside(path, remove):
+    """Renames directory, so that its name can be reused right away, and removes it."""
+    aside = '%s%s%s-%s' % (path, _REMOVED_INFIX, os.getpid(), time.time_ns())
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return
+    except OSError:
+        _rmtree(path)  # can't be renamed, so it can't be removed in background either
+        return
+    remove(aside)
+
+
+def _logdir_path(item):
     plugin = item.config.pluginmanager.getplugin('_logger')
-    logdir = plugin.logsdir() / _sanitize_nodeid(item.nodeid)
-    logdir.mkdir(parents=True)
+    return plugin.logsdir() / _item_nodepath(item)
+
+
+def _make_logdir(item):
+    logdir = _logdir_path(item)
+    item.config.pluginmanager.getplugin('_logger').make_dir(logdir)
     return logdir
 
 
@@ -385,14 +1075,68 @@ def _enable(handlers):
 def _disable(handlers):
     for hdlr in handlers:
         hdlr.logger.removeHandler(hdlr)
+
+
+def _unwrap(hdlr):
+    while isinstance(hdlr, (_AsyncHandler, _InstrumentedHandler)):
+        hdlr = hdlr.target
+    return hdlr
+
+
+def _file_handlers(handlers):
+    for hdlr in handlers:
+        hdlr = _unwrap(hdlr)
+        if isinstance(hdlr, (_FileHandler, _RingBufferHandler)):
+            yield hdlr
+
+
+def _close(handlers):
+    for hdlr in handlers:
         hdlr.close()
 
 
-def _log_option_parser(loggers):
+class _LoggerIndex:
+    """Index of logger names of `LoggerConfig` rows.
+
+    :ivar rows: maps logger name to the first row with it
+    :ivar names: maps logger name to configured names of this logger and its descendants
+    """
+
+    def __init__(self, loggers=()):
+        self.rows = {}
+        self.names = {}
+        for row in loggers:
+            self.add(row)
+
+    def add(self, row):
+        for name in row[0]:
+            if name in self.rows:
+                continue
+            self.rows[name] = row
+            parts = name.split('.') if name else []
+            for index in range(len(parts) + 1):
+                self.names.setdefault('.'.join(parts[:index]), []).append(name)
+
+
+def _log_option_parser(loggers, index=None):
+    """Parser of loggers option. Option's elements are logger names or wildcards, "name.*"
+    standing for the configured logger and its descendants or "*" for all configured loggers,
+    optionally followed by level.
+
+    :param index: `_LoggerIndex` of `loggers`, made if not given
+    """
+    index = _LoggerIndex(loggers) if index is None else index
+
     def parser(arg):
         def to_out(elem):
             def find_row(name):
-                return next((row for row in loggers if name in row[0]), None)
+                return index.rows.get(name)
+
+            def find_names(pattern):
+                if pattern == '*':
+                    return index.names.get('')
+                if pattern.endswith('.*'):
+                    return index.names.get(pattern[:-2])
 
             def bad_logger(name):
                 names = [x for row in loggers for x in row[0]]
@@ -406,36 +1150,39 @@ def _log_option_parser(loggers):
 
             row = find_row(elem)
             if row:
-                return elem, row[1]
+                return [(elem, row[1])]
+            names = find_names(elem)
+            if names:
+                return [(name, index.rows[name][1]) for name in names]
             if '.' in elem:
                 elem_name, elem_level = elem.rsplit('.', 1)
-                row = find_row(elem_name)
+                names = [elem_name] if find_row(elem_name) else find_names(elem_name)
                 level = _sanitize_level(elem_level, raises=False)
-                if row and level is not None:
-                    return elem_name, level
-                if row:
+                if names and level is not None:
+                    return [(name, level) for name in names]
+                if names:
                     bad_level(elem_level)
                 if level is not None:
                     bad_logger(elem_name)
             bad_logger(elem)
-        return [to_out(x) for x in arg.split(',') if x]
+        return [out for x in arg.split(',') if x for out in to_out(x)]
     return parser
 
 
 def _loggers_from_logcfg(logcfg, logopt):
-    def to_stdout(loggers, opt):
-        def one(loggers, one):
+    def to_stdout(rows, opt):
+        def one(rows, one):
             if isinstance(one, str):
-                return one, next(row for row in loggers if one in row[0])[1]
+                return one, rows[one][1]  # option's default given as list of names
             else:
                 return one
-        return [one(loggers, x) for x in opt]
+        return [one(rows, x) for x in opt]
 
     def to_file(loggers):
         return [(name, row[2]) for row in loggers for name in row[0]]
 
     return Loggers(
-        stdout=to_stdout(logcfg._loggers, logopt),
+        stdout=to_stdout(logcfg._index.rows, logopt),
         file_=to_file(logcfg._loggers)
     )
 
@@ -455,27 +1202,181 @@ def _loggers_from_hooks(item):
     )
 
 
+_hook_loggers_scopes = (None, 'session', 'module', 'class')
+
+
+def _scope_nodeid(item, scope):
+    if scope == 'session':
+        return ''
+    node = item.getparent(pytest.Class) if scope == 'class' else None
+    node = node or item.getparent(pytest.Module) or item.parent
+    return node.nodeid
+
+
 def _choose_loggers(config_loggers, hook_loggers):
     assert (not config_loggers) or (not hook_loggers), \
         'pytest_logger_config and pytest_logger_*loggers hooks used at the same time'
     return config_loggers or hook_loggers
 
 
-def _make_handlers(stdoutloggers, fileloggers, item, formatter):
+def _make_root_enabler(stdoutloggers, fileloggers, level_gating):
+    enabled = bool(stdoutloggers and fileloggers)
+    if level_gating:
+        return LevelGate(enabled, stdoutloggers + fileloggers)
+    return RootEnabler(enabled)
+
+
+def _inherited_level(logger):
+    """Level logger would have with root logger at NOTSET, as `RootEnabler` sets it."""
+    logger = logger.parent
+    while logger and logger is not logging.root:
+        if logger.level:
+            return logger.level
+        logger = logger.parent
+    return logging.NOTSET
+
+
+def _lowest_handler_level(logger, handler_levels):
+    level = None
+    while logger:
+        if logger in handler_levels:
+            level = handler_levels[logger] if level is None else min(level, handler_levels[logger])
+        if not logger.propagate:
+            break
+        logger = logger.parent
+    return level
+
+
+def _make_handlers(stdoutloggers, fileloggers, item, formatter, plugin):
+    pool = plugin._pool
     handlers = []
+    upper_levels = {}
     if stdoutloggers:
-        handlers += _make_stdout_handlers(stdoutloggers, formatter)
-    if fileloggers:
-        logdir = _make_logdir(item)
-        handlers += _make_file_handlers(fileloggers, formatter, logdir)
+        stdoutloggers, upper_levels = _collapse_loggers(stdoutloggers)
+    if len(stdoutloggers) + len(fileloggers) > 1:
+        # record propagating to several handlers (or logged to terminal and file) is formatted once
+        formatter = _FormatOnceFormatter(formatter)
+    if stdoutloggers:
+        new_handler = pool.get_stdout_handler if pool else _new_stdout_handler
+        handlers += _make_stdout_handlers(stdoutloggers, formatter, new_handler)
+        for hdlr in handlers:
+            upper_level = upper_levels.get(hdlr.logger.name if hdlr.logger is not logging.root else '')
+            if upper_level is not None:
+                hdlr.addFilter(_LevelBelow(upper_level))
+    if fileloggers and plugin._keep_logs_outcomes:
+        capacity = plugin._keep_logs_capacity
+        deferred = plugin._keep_logs_deferred_formatting
+        handlers += _make_file_handlers(fileloggers, formatter, Path(),
+                                        lambda filename: _RingBufferHandler(filename, capacity, deferred))
+    elif fileloggers:
+        if plugin._archive_filename:
+            logdir = Path()  # files are spooled, not written to logs directory
+        elif plugin._lazy_logdirs:
+            logdir = _logdir_path(item)  # directory is made by file handler before writing first record
+        else:
+            logdir = _make_logdir(item)
+        new_handler = pool.get_file_handler if pool else plugin._new_file_handler
+        file_handlers = _make_file_handlers(fileloggers, formatter, logdir, new_handler)
+        if plugin._logger_limits or plugin._test_limits:
+            _set_limits(fileloggers, file_handlers, plugin)
+        if plugin._writer:
+            file_handlers = [_AsyncHandler(hdlr, plugin._writer) for hdlr in file_handlers]
+        handlers += file_handlers
+    if plugin._instrumentation:
+        test_stats = plugin._instrumentation.test(item.nodeid)
+        handlers = [_InstrumentedHandler(hdlr, test_stats, plugin._instrumentation.loggers) for hdlr in handlers]
     return handlers
 
 
-def _make_stdout_handlers(loggers, fmt):
+def _collapse_loggers(loggers):
+    """Collapses loggers of a single output, so that records which propagate to handlers
+    of several of them are emitted once, by handler of logger closest to record's origin.
+
+    :return: loggers without ones handling only records which their ancestors handle,
+        and levels (by logger name) of records which ancestors handle, which loggers should filter out
+    """
+    levels = {}
+    for name, level in loggers:
+        levels[name] = min(level, levels.get(name, level))
+    if len(levels) == len(loggers) and not any('.' in name for name in levels) and '' not in levels:
+        return loggers, {}  # unrelated loggers, nothing to collapse
+    handler_levels = {logging.getLogger(name): level for name, level in levels.items()}
+    collapsed = []
+    upper_levels = {}
+    for name, level in levels.items():
+        logger = logging.getLogger(name)
+        upper_level = _lowest_handler_level(logger.parent, handler_levels) if logger.propagate else None
+        if upper_level is None:
+            collapsed.append((name, level))
+        elif level < upper_level:
+            collapsed.append((name, level))
+            upper_levels[name] = upper_level
+    return collapsed, upper_levels
+
+
+class _FormatOnceFormatter:
+    """Wraps formatter shared by test's handlers, so that the same record is formatted once,
+    when consecutive handlers format it. Handlers run synchronously one after another,
+    so caching the last record suffices. Records formatted in background thread by
+    asynchronous handlers are their copies, so they don't make false hits."""
+
+    def __init__(self, formatter):
+        self.formatter = formatter
+        self._last = (None, None)  # record and its text, swapped at once
+
+    def format(self, record):
+        last_record, text = self._last
+        if record is not last_record:
+            text = self.formatter.format(record)
+            self._last = (record, text)
+        return text
+
+    def forget(self):
+        """Drops the last record, which may hold traceback's frames, once test's logging is done."""
+        self._last = (None, None)
+
+    def __getattr__(self, name):
+        return getattr(self.formatter, name)
+
+
+class _LevelBelow:
+    def __init__(self, level):
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno < self.level
+
+
+def _set_limits(fileloggers, file_handlers, plugin):
+    test_budget = _LogBudget(*plugin._test_limits) if plugin._test_limits else None
+    for (name, _), hdlr in zip(fileloggers, file_handlers):
+        limits = plugin._logger_limits.get(name)
+        budgets = [budget for budget in (_LogBudget(*limits) if limits else None, test_budget) if budget]
+        hdlr.set_limits(budgets or None, plugin._tail_size)
+
+
+class _LogBudget:
+    def __init__(self, max_bytes, max_records):
+        self.bytes = float('inf') if max_bytes is None else max_bytes
+        self.records = float('inf') if max_records is None else max_records
+
+    def fits(self, size):
+        return self.records >= 1 and self.bytes >= size
+
+    def take(self, size):
+        self.records -= 1
+        self.bytes -= size
+
+
+def _new_stdout_handler():
+    return logging.StreamHandler(sys.stdout)
+
+
+def _make_stdout_handlers(loggers, fmt, new_handler=_new_stdout_handler):
     def make_handler(logger_and_level, fmt):
         name, level = logger_and_level
         logger = logging.getLogger(name)
-        handler = logging.StreamHandler(sys.stdout)
+        handler = new_handler()
         handler.setFormatter(fmt)
         handler.setLevel(level)
         handler.logger = logger
@@ -484,16 +1385,667 @@ def _make_stdout_handlers(loggers, fmt):
     return [make_handler(lgr, fmt) for lgr in loggers]
 
 
-def _make_file_handlers(loggers, fmt, logdir):
+def _make_file_handlers(loggers, fmt, logdir, new_handler=None):
     def make_handler(logdir, logger_and_level, fmt):
         name, level = logger_and_level
         logger = logging.getLogger(name)
         name = name or 'logs'
         logfile = str(logdir / name)
-        handler = logging.FileHandler(filename=logfile, mode='w', delay=True)
+        handler = (new_handler or _FileHandler)(logfile)
         handler.setFormatter(fmt)
         handler.setLevel(level)
         handler.logger = logger
         return handler
 
     return [make_handler(logdir, lgr, fmt) for lgr in loggers]
+
+
+class _Dispatch:
+    """Routes records from session-wide `_Dispatcher` handlers to handlers of current test.
+
+    Enabling and disabling test's handlers swaps a single mapping.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self._dispatchers = {}
+
+    def install(self, loggers):
+        for logger in loggers:
+            if logger not in self._dispatchers:
+                self._dispatchers[logger] = dispatcher = _Dispatcher(self, logger)
+                logger.addHandler(dispatcher)
+
+    def uninstall(self):
+        for logger, dispatcher in self._dispatchers.items():
+            logger.removeHandler(dispatcher)
+            dispatcher.close()
+        self._dispatchers.clear()
+
+    def enable(self, handlers):
+        routes = {}
+        for hdlr in handlers:
+            routes.setdefault(hdlr.logger, []).append(hdlr)
+        self.install(routes)
+        self.routes = routes
+
+    def disable(self):
+        self.routes = {}
+
+
+class _Dispatcher(logging.Handler):
+    def __init__(self, dispatch, logger):
+        logging.Handler.__init__(self)
+        self._dispatch = dispatch
+        self._logger = logger
+
+    def handle(self, record):
+        for hdlr in self._dispatch.routes.get(self._logger, ()):
+            if record.levelno >= hdlr.level:
+                hdlr.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+
+class _FileHandler(logging.FileHandler):
+    """Lazily opened file handler, which can be pointed at another file.
+
+    With `buffer_size` output is flushed to file only when that many bytes accumulate,
+    when record of ERROR level or higher is emitted and when file is closed.
+
+    With `compression` file name gets a suffix and output is flushed only when file is closed.
+
+    With `make_dir` file's directory is made only when file is opened, i.e. on first record.
+
+    With `spool` file isn't written, UTF-8 output is held in a temporary file (in memory until it
+    grows large), to be retrieved with `spool` method before handler is closed or detached.
+
+    With `binary` records are written with `_RecordEncoder` and file name gets ".bin" suffix.
+    """
+
+    level_counts = None
+
+    def __init__(self, filename, buffer_size=0, compression=None, make_dir=None, spool=False, binary=False):
+        self._buffer_size = buffer_size
+        self._compression = compression
+        self._make_dir = make_dir
+        self._spool = spool
+        self._binary = binary
+        self._encoder = None
+        self._limits = None
+        self._tail = None
+        self._flush_each = not (buffer_size or compression)
+        logging.FileHandler.__init__(self, filename=self._filename(filename), mode='w', delay=True)
+
+    def _filename(self, filename):
+        if self._binary:
+            filename += _BINARY_SUFFIX
+        return filename + self._compression.suffix if self._compression else filename
+
+    def _open(self):
+        if self._spool:
+            spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+            if self._binary:
+                return spool
+            return codecs.getwriter('utf-8')(spool, getattr(self, 'errors', None) or 'strict')
+        if self._make_dir:
+            self._make_dir(os.path.dirname(self.baseFilename))
+        if self._binary:
+            if self._compression:
+                return self._compression.open_binary(self.baseFilename)
+            return open(self.baseFilename, 'wb', buffering=self._buffer_size or -1)
+        if self._compression:
+            return self._compression.open(self.baseFilename, self.encoding, getattr(self, 'errors', None))
+        if not self._buffer_size:
+            return logging.FileHandler._open(self)
+        stream = open(self.baseFilename, self.mode, buffering=self._buffer_size,
+                      encoding=self.encoding, errors=getattr(self, 'errors', None))
+        stream._CHUNK_SIZE = self._buffer_size  # otherwise text layer passes down writes in 8k chunks
+        return stream
+
+    def flush(self):
+        if self._flush_each:
+            logging.FileHandler.flush(self)
+
+    def emit(self, record):
+        if self.level_counts is not None:
+            self.level_counts[record.levelname] += 1
+        if self._limits is not None:
+            self._emit_limited(record)
+        elif self._binary:
+            try:
+                self._write(self._encode(record))
+            except Exception:
+                self.handleError(record)
+        else:
+            logging.FileHandler.emit(self, record)
+        if self._buffer_size and record.levelno >= logging.ERROR:
+            logging.FileHandler.flush(self)
+
+    def _encode(self, record, define_name=False):
+        if not self._binary:
+            return self.format(record) + self.terminator
+        if self._encoder is None:
+            # timestamps are relative to test start, like in DefaultFormatter
+            self._encoder = _RecordEncoder(getattr(self.formatter, '_start', record.created))
+        return self._encoder.encode(record, self.formatter or _default_formatter, define_name)
+
+    def _write(self, data):
+        if self.stream is None:
+            self.stream = self._open()
+            if self._binary:
+                self.stream.write(self._encoder.header())
+        self.stream.write(data)
+        self.flush()
+
+    def set_limits(self, budgets, tail_size):
+        """Makes handler write logs only as long as they fit in all `budgets`. Further logs are
+        dropped, except for last ones of total size up to `tail_size`, written by `write_tail`."""
+        self._limits = budgets
+        self._tail_size = tail_size
+        self._tail = None
+
+    def _emit_limited(self, record):
+        try:
+            if self._tail is None:
+                data = self._encode(record)
+                size = len(data)
+                if all(budget.fits(size) for budget in self._limits):
+                    for budget in self._limits:
+                        budget.take(size)
+                    self._write(data)
+                    return
+                self._tail = collections.deque()
+                self._tail_used = 0
+                self._dropped = 0
+                if self._binary:
+                    data = self._encode(record, define_name=True)  # tail may be missing name's definition
+            else:
+                data = self._encode(record, define_name=True)
+            self._tail.append(data)
+            self._tail_used += len(data)
+            while self._tail_used > self._tail_size:
+                self._tail_used -= len(self._tail.popleft())
+                self._dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def write_tail(self):
+        """Writes logs retained after limits were exceeded."""
+        if self._tail is None:
+            return
+        if self._dropped:
+            marker = logging.makeLogRecord({'name': 'pytest_logger', 'levelno': logging.WARNING,
+                                            'levelname': 'WARNING', 'msg': '(%s logs dropped)' % self._dropped})
+            self._write(self._encode(marker, define_name=True) if self._binary
+                        else '(%s logs dropped)\n' % self._dropped)
+        for data in self._tail:
+            self._write(data)
+        self._tail = None
+        self._dropped = 0
+
+    def spool(self):
+        """Binary file with output of spooling handler, None if nothing was logged."""
+        if self._spool and self.stream:
+            self.stream.flush()
+            spool = self.stream if self._binary else self.stream.stream
+            spool.seek(0)
+            return spool
+
+    def retarget(self, filename):
+        self.detach()
+        self.baseFilename = os.path.abspath(self._filename(filename))
+
+    def detach(self):
+        """Closes file, but (unlike `close`) leaves handler usable."""
+        self.acquire()
+        try:
+            stream, self.stream = self.stream, None
+            self._encoder = None
+            self._tail = None
+            if stream:
+                stream.close()
+        finally:
+            self.release()
+
+
+class _Compression:
+    suffixes = {
+        'gzip': '.gz',
+        'zstd': '.zst',
+    }
+    default_levels = {
+        'gzip': 6,
+        'zstd': 3,
+    }
+
+    def __init__(self, method, level=None):
+        if method not in self.suffixes:
+            raise ValueError('got unexpected compression: <%s>, expected one of: %s'
+                             % (method, ', '.join(sorted(self.suffixes))))
+        if method == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise ValueError('zstd compression requires "zstandard" package')
+        self.method = method
+        self.level = self.default_levels[method] if level is None else level
+        self.suffix = self.suffixes[method]
+
+    def open(self, filename, encoding=None, errors=None):
+        """Opens compressed file for writing text."""
+        if self.method == 'gzip':
+            import gzip
+            return gzip.open(filename, 'wt', compresslevel=self.level, encoding=encoding, errors=errors)
+        return io.TextIOWrapper(self.open_binary(filename), encoding=encoding, errors=errors)
+
+    def open_binary(self, filename):
+        """Opens compressed file for writing bytes."""
+        if self.method == 'gzip':
+            import gzip
+            return gzip.open(filename, 'wb', compresslevel=self.level)
+        import zstandard
+        return zstandard.ZstdCompressor(level=self.level).stream_writer(open(filename, 'wb'))
+
+    def copy(self, src, dst):
+        """Compresses contents of binary file `src` into a gzip member or zstd frame appended to `dst`."""
+        if self.method == 'gzip':
+            import gzip
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=self.level) as f:
+                shutil.copyfileobj(src, f)
+        else:
+            import zstandard
+            zstandard.ZstdCompressor(level=self.level).copy_stream(src, dst)
+
+
+_SPOOL_SIZE = 1024 * 1024
+
+_BINARY_SUFFIX = '.bin'
+_BINARY_MAGIC = b'PYTESTLOGGER\x00\x01'
+_BINARY_HEADER = struct.Struct('<d')  # start time
+_BINARY_ENTRY = struct.Struct('<IB')  # size of entry after this field, entry type
+_BINARY_NAME = struct.Struct('<IBI')  # ..., logger id, followed by logger name
+_BINARY_RECORD = struct.Struct('<IBqHII')  # ..., useconds since start, level, logger id, message size,
+# followed by message and exception/stack text
+_BINARY_NAME_TYPE = 0
+_BINARY_RECORD_TYPE = 1
+
+_default_formatter = logging.Formatter()
+
+
+class _RecordEncoder:
+    """Encodes records of a binary log file: header with start time followed by length-prefixed
+    entries, which are either records or logger names. Logger name is written once per file,
+    before its first record, records refer to it by id.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._names = {}
+
+    def header(self):
+        return _BINARY_MAGIC + _BINARY_HEADER.pack(self._start)
+
+    def encode(self, record, formatter, define_name=False):
+        name_entry = b''
+        name_id = self._names.get(record.name)
+        if name_id is None:
+            name_id = self._names[record.name] = len(self._names)
+            define_name = True
+        if define_name:
+            name = record.name.encode('utf-8')
+            name_entry = _BINARY_NAME.pack(_BINARY_NAME.size - 4 + len(name), _BINARY_NAME_TYPE, name_id) + name
+        message = record.getMessage().encode('utf-8', 'backslashreplace')
+        extra = ''
+        if record.exc_info and not record.exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+        if record.exc_text:
+            extra = record.exc_text
+        if record.stack_info:
+            extra = (extra + '\n' if extra else '') + formatter.formatStack(record.stack_info)
+        extra = extra.encode('utf-8', 'backslashreplace')
+        useconds = round((record.created - self._start) * 1e6)
+        return name_entry + _BINARY_RECORD.pack(_BINARY_RECORD.size - 4 + len(message) + len(extra),
+                                                _BINARY_RECORD_TYPE, useconds, record.levelno, name_id,
+                                                len(message)) + message + extra
+
+
+def _write_spool(hdlr, logdir, compression=None):
+    """Writes output of spooling file handler to file in `logdir`.
+
+    :return: path of written file, None if nothing was logged
+    """
+    hdlr.acquire()  # asynchronous writer may be emitting records meanwhile
+    try:
+        spool = hdlr.spool()
+        if not spool:
+            return None
+        filename = os.path.join(str(logdir), os.path.basename(hdlr.baseFilename))
+        if compression:
+            filename += compression.suffix
+            f = compression.open_binary(filename)
+        else:
+            f = open(filename, 'wb')
+        with f:
+            shutil.copyfileobj(spool, f)
+        return filename
+    finally:
+        hdlr.release()
+
+
+def _write_logfile(filename, lines, compression=None):
+    if compression:
+        filename += compression.suffix
+        f = compression.open(filename)
+    else:
+        f = open(filename, 'w')
+    with f:
+        f.writelines(lines)
+    return filename
+
+
+class _Archive:
+    """Session-wide file, to which logs of all tests are appended instead of being written
+    to separate files. Each log file is a segment of archive. Segments are listed in
+    index file (JSON Lines) with the same name and ".idx" suffix.
+
+    With compression each segment is a separate gzip member or zstd frame, so that
+    it can be decompressed on its own, as well as the whole archive.
+    """
+
+    def __init__(self, path, compression=None):
+        self.path = path
+        self._compression = compression
+        self._file = open(path, 'wb')
+        self._index = open(path + '.idx', 'w')
+
+    def append(self, item, name, src):
+        """Appends contents of binary file `src` as log file `name` of test `item`.
+
+        :return int: size of appended segment in bytes
+        """
+        offset = self._file.tell()
+        if self._compression:
+            self._compression.copy(src, self._file)
+        else:
+            shutil.copyfileobj(src, self._file)
+        length = self._file.tell() - offset
+        self._index.write(json.dumps({'nodeid': item.nodeid, 'dir': _item_nodepath(item), 'name': name,
+                                      'offset': offset, 'length': length}))
+        self._index.write('\n')
+        return length
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+
+class _RingBufferHandler(logging.Handler):
+    """Holds last `capacity` formatted records of a file logger until it's known
+    whether they should be written to a file.
+
+    With `deferred` records are held and formatted only when written.
+    """
+
+    level_counts = None
+
+    def __init__(self, filename, capacity, deferred=False):
+        logging.Handler.__init__(self)
+        self.filename = filename
+        self.records = 0
+        self._deferred = deferred
+        self._lines = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self._lines.append(_snapshot(record, self.formatter) if self._deferred else self.format(record))
+            self.records += 1
+            if self.level_counts is not None:
+                self.level_counts[record.levelname] += 1
+        except Exception:
+            self.handleError(record)
+
+    def lines(self):
+        dropped = self.records - len(self._lines)
+        if dropped:
+            yield '(%s earlier logs dropped)\n' % dropped
+        for line in self._lines:
+            if self._deferred:
+                try:
+                    line = self.format(line)
+                except Exception:
+                    self.handleError(line)
+                    continue
+            yield line + '\n'
+
+    def close(self):
+        # logs (with deferred formatting: copies of records, with their arguments and tracebacks)
+        # are either written or discarded by now, handler may stay referenced till session end
+        self._lines.clear()
+        logging.Handler.close(self)
+
+
+_immutable_types = (str, int, float, bool, type(None), bytes)
+
+
+def _snapshot(record, formatter):
+    """Record which can be formatted later: with message rendered if it, or its arguments, may be mutable
+    and with traceback formatted (not to hold frames)."""
+    args = record.args
+    if type(record.msg) is not str or (args and not all(type(arg) in _immutable_types
+                                                        for arg in (args if type(args) is tuple else (args,)))):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+    if record.exc_info:
+        if not record.exc_text:
+            record.exc_text = (formatter or _default_formatter).formatException(record.exc_info)
+        if record.exc_text:
+            record = copy.copy(record)
+            record.exc_info = None
+    return record
+
+
+class _HandlerPool:
+    """Handlers and formatter kept for the session, reused by consecutive tests."""
+
+    def __init__(self, formatter, new_file_handler=_FileHandler):
+        self._formatter = formatter
+        self._new_file_handler = new_file_handler
+        self._stdout_handlers = []
+        self._file_handlers = []
+
+    def restart_formatter(self):
+        if isinstance(self._formatter, DefaultFormatter):
+            self._formatter.restart()
+        return self._formatter
+
+    def get_stdout_handler(self):
+        if not self._stdout_handlers:
+            return _new_stdout_handler()
+        handler = self._stdout_handlers.pop()
+        if handler.stream is not sys.stdout:
+            handler.setStream(sys.stdout)
+        return handler
+
+    def get_file_handler(self, filename):
+        if not self._file_handlers:
+            return self._new_file_handler(filename)
+        handler = self._file_handlers.pop()
+        handler.retarget(filename)
+        return handler
+
+    def put(self, handlers):
+        for hdlr in handlers:
+            hdlr = _unwrap(hdlr)
+            if isinstance(hdlr, _FileHandler):
+                hdlr.detach()
+                self._file_handlers.append(hdlr)
+            elif type(hdlr) is logging.StreamHandler:
+                del hdlr.filters[:]
+                self._stdout_handlers.append(hdlr)
+            else:
+                hdlr.close()
+
+    def close(self):
+        _close(self._stdout_handlers + self._file_handlers)
+        del self._stdout_handlers[:], self._file_handlers[:]
+
+
+class _AsyncFileWriter:
+    """Thread emitting records to file handlers on behalf of `_AsyncHandler` instances."""
+
+    def __init__(self):
+        import queue
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='pytest-logger-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, target, record):
+        self._queue.put((target, record))
+
+    def flush(self):
+        """Blocks until all records put so far are emitted."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait()
+
+    def stop(self):
+        self._queue.put((None, None))
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            target, record = self._queue.get()
+            if target is not None:
+                try:
+                    target.handle(record)
+                except Exception:
+                    # e.g. file which can't be opened, thread must live on for flush to return
+                    target.handleError(record)
+            elif record is not None:
+                record.set()
+            else:
+                return
+
+
+class _AsyncHandler(logging.Handler):
+    """Passes records to `target` handler through `_AsyncFileWriter`,
+    like `logging.handlers.QueueHandler` passes them through a queue."""
+
+    def __init__(self, target, writer):
+        logging.Handler.__init__(self)
+        self.setLevel(target.level)
+        self.queue = writer
+        self.target = target
+        self.logger = target.logger
+
+    def prepare(self, record):
+        # arguments may be mutated by the caller afterwards and traceback's frames would be held
+        # until record is written, message and traceback need to be rendered here
+        if record.exc_info and not record.exc_text:
+            record.exc_text = (self.target.formatter or _default_formatter).formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put(self.target, record)
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.target.close()
+        logging.Handler.close(self)
+
+
+class _Instrumentation:
+    """Logging overhead measured per test and per logger (by name of logger which made record)."""
+
+    def __init__(self):
+        self.tests = {}
+        self.loggers = {}
+
+    def test(self, nodeid):
+        stats = self.tests.get(nodeid)
+        if stats is None:
+            stats = self.tests[nodeid] = {'setup': 0.0, 'teardown': 0.0, 'emit': 0.0, 'records': 0, 'bytes': 0}
+        return stats
+
+    def to_json(self):
+        return {
+            'tests': self.tests,
+            'loggers': {name: {'emitted': emitted, 'filtered': filtered, 'emit': emit}
+                        for name, (emitted, filtered, emit) in self.loggers.items()},
+        }
+
+    def merge(self, data):
+        """Merges stats of another process, in format returned by `to_json`."""
+        self.tests.update(data['tests'])
+        for name, logger_stats in data['loggers'].items():
+            stats = self.loggers.setdefault(name, [0, 0, 0.0])
+            stats[0] += logger_stats['emitted']
+            stats[1] += logger_stats['filtered']
+            stats[2] += logger_stats['emit']
+
+    def summary(self, top):
+        def total(stats):
+            return stats['setup'] + stats['teardown'] + stats['emit']
+
+        tests = self.tests.values()
+        yield 'total %.3fs: setup %.3fs, emit %.3fs, teardown %.3fs' % (
+            sum(map(total, tests)), sum(stats['setup'] for stats in tests),
+            sum(stats['emit'] for stats in tests), sum(stats['teardown'] for stats in tests))
+        yield 'most expensive tests:'
+        for nodeid, stats in sorted(self.tests.items(), key=lambda item: total(item[1]), reverse=True)[:top]:
+            yield '  %.4fs %s (setup %.4fs, emit %.4fs, teardown %.4fs, %s records, %s bytes)' % (
+                total(stats), nodeid, stats['setup'], stats['emit'], stats['teardown'],
+                stats['records'], stats['bytes'])
+        yield 'most expensive loggers:'
+        for name, (emitted, filtered, emit) in sorted(self.loggers.items(), key=lambda item: item[1][2],
+                                                      reverse=True)[:top]:
+            yield '  %.4fs %s (%s records emitted, %s filtered)' % (emit, name, emitted, filtered)
+
+
+class _InstrumentedHandler(logging.Handler):
+    """Measures time spent in handler in test's thread and counts records it gets,
+    as emitted or filtered by its level. Doesn't filter by level itself,
+    so that records below handler's level are counted."""
+
+    def __init__(self, target, test_stats, logger_stats):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.logger = target.logger
+        self._test_stats = test_stats
+        self._logger_stats = logger_stats
+
+    def handle(self, record):
+        start = time.perf_counter()
+        stats = self._logger_stats.get(record.name)
+        if stats is None:
+            stats = self._logger_stats[record.name] = [0, 0, 0.0]
+        if record.levelno < self.target.level:
+            stats[1] += 1
+            return False
+        rv = self.target.handle(record)
+        elapsed = time.perf_counter() - start
+        stats[0] += 1
+        stats[2] += elapsed
+        self._test_stats['emit'] += elapsed
+        self._test_stats['records'] += 1
+        return rv
+
+    def emit(self, record):
+        self.handle(record)
+
+    def close(self):
+        self.target.close()
+        logging.Handler.close(self)
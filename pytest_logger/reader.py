@@ -0,0 +1,227 @@
+"""Reading logs written by pytest-logger with :py:class:`DefaultFormatter` layout
+or in binary format (see :py:meth:`LoggerConfig.set_binary_logs`).
+
+Files are memory-mapped and scanned for record headers, only records passing
+filters are decoded, so that large logs directories can be searched quickly::
+
+    from pytest_logger.reader import iter_records
+
+    for record in iter_records('logs', level=logging.ERROR, loggers=['myapp']):
+        print(record.dir, record.file, record.message)
+
+Run as a script to render logs as text::
+
+    python -m pytest_logger.reader logs/test_p.py/test_cat/proc.bin
+"""
+
+import os
+import re
+import gzip
+import json
+import mmap
+import logging
+import argparse
+import collections
+
+from pytest_logger.plugin import (DefaultFormatter, _BINARY_MAGIC, _BINARY_HEADER, _BINARY_ENTRY, _BINARY_NAME,
+                                  _BINARY_RECORD, _BINARY_NAME_TYPE, _BINARY_RECORD_TYPE)
+
+Record = collections.namedtuple('Record', 'dir file time levelno name message')
+Record.__doc__ = """Log record read from log file.
+
+:param dir: test's directory relative to logs directory, e.g. "test_p.py/test_cat"
+:param file: log file name
+:param time: seconds since test start
+:param levelno: level of record
+:param name: logger name
+:param message: message, with traceback if logged
+"""
+
+_header_re = re.compile(rb'^(\d\d):(\d\d\.\d\d\d) (\w+) (\S+): ', re.M)
+
+_levels = {name.encode(): levelno for levelno, name in DefaultFormatter.short_level_names.items()}
+
+
+def iter_records(path, level=logging.NOTSET, loggers=None):
+    """Iterates records of logs directory, archive or log file.
+
+    :param path: logs directory, archive written with :py:meth:`LoggerConfig.set_archive`
+        (needs accompanying ".idx" file) or single log file
+    :param level: records below this level are skipped
+    :param loggers: names of loggers, records of other loggers
+        (other than these and their children) are skipped
+    """
+    path = str(path)
+    if os.path.isdir(path):
+        return _iter_logsdir(path, level, loggers)
+    elif os.path.exists(path + '.idx'):
+        return _iter_archive(path, level, loggers)
+    else:
+        return _iter_file(path, '', os.path.basename(path), level, loggers)
+
+
+def _iter_logsdir(path, level, loggers):
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath, path).replace(os.sep, '/')
+        for filename in sorted(filenames):
+            filepath = os.path.join(dirpath, filename)
+            if os.path.islink(filepath):
+                continue  # e.g. split by outcome links (to test directories which may not exist)
+            if reldir == '.':
+                # top level has no test logs, but there may be archives
+                if os.path.exists(filepath + '.idx'):
+                    for record in _iter_archive(filepath, level, loggers):
+                        yield record
+                continue
+            for record in _iter_file(filepath, reldir, filename, level, loggers):
+                yield record
+
+
+def _iter_file(filepath, dir, file, level, loggers):
+    if filepath.endswith(('.gz', '.zst')):
+        with open(filepath, 'rb') as f:
+            data = _decompress(f.read(), filepath)
+        for record in _iter_buffer(data, 0, len(data), dir, file, level, loggers):
+            yield record
+        return
+    with open(filepath, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for record in _iter_buffer(data, 0, len(data), dir, file, level, loggers):
+                yield record
+
+
+def _iter_archive(filepath, level, loggers):
+    with open(filepath + '.idx') as f:
+        index = [json.loads(line) for line in f]
+    if not index:
+        return
+    compressed = filepath.endswith(('.gz', '.zst'))
+    with open(filepath, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for entry in index:
+                start = entry['offset']
+                end = start + entry['length']
+                if compressed:
+                    segment = _decompress(data[start:end], filepath)
+                    records = _iter_buffer(segment, 0, len(segment), entry['dir'], entry['name'], level, loggers)
+                else:
+                    records = _iter_buffer(data, start, end, entry['dir'], entry['name'], level, loggers)
+                for record in records:
+                    yield record
+
+
+def _decompress(data, filepath):
+    if filepath.endswith('.gz'):
+        return gzip.decompress(data)
+    import zstandard
+    # decompression object stops at the end of frame, file may consist of several (e.g. archive's segments)
+    chunks = []
+    data = bytes(data)
+    while data:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        chunks.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(chunks)
+
+
+def format_record(record):
+    """Formats record in :py:class:`DefaultFormatter` layout."""
+    msecs = round(record.time * 1e6) // 1000
+    seconds, msecs = divmod(msecs, 1000)
+    minutes, seconds = divmod(seconds % 3600, 60)
+    levelname = DefaultFormatter.short_level_names.get(record.levelno) or 'l%s' % record.levelno
+    return '%02d:%02d.%03d %s %s: %s' % (minutes, seconds, msecs, levelname, record.name, record.message)
+
+
+def _iter_buffer(data, start, end, dir, file, level, loggers):
+    if data[start:start + len(_BINARY_MAGIC)] == _BINARY_MAGIC:
+        return _iter_binary(data, start, end, dir, file, level, loggers)
+    return _iter_text(data, start, end, dir, file, level, loggers)
+
+
+def _iter_binary(data, start, end, dir, file, level, loggers):
+    pos = start + len(_BINARY_MAGIC)
+    base, = _BINARY_HEADER.unpack_from(data, pos)
+    pos += _BINARY_HEADER.size
+    names = {}
+    wanted = {}
+    while pos < end:
+        size, kind = _BINARY_ENTRY.unpack_from(data, pos)
+        entry_end = pos + 4 + size
+        if entry_end > end:
+            break  # truncated by interrupted test run
+        if kind == _BINARY_NAME_TYPE:
+            _, _, name_id = _BINARY_NAME.unpack_from(data, pos)
+            name = data[pos + _BINARY_NAME.size:entry_end].decode('utf-8')
+            names[name_id] = name
+            wanted[name_id] = loggers is None or any(name == lgr or name.startswith(lgr + '.') for lgr in loggers)
+        elif kind == _BINARY_RECORD_TYPE:
+            _, _, useconds, levelno, name_id, message_size = _BINARY_RECORD.unpack_from(data, pos)
+            if levelno >= level and wanted[name_id]:
+                message_end = pos + _BINARY_RECORD.size + message_size
+                message = data[pos + _BINARY_RECORD.size:message_end].decode('utf-8')
+                if message_end < entry_end:
+                    message += '\n' + data[message_end:entry_end].decode('utf-8')
+                yield Record(dir, file, useconds / 1e6, levelno, names[name_id], message)
+        pos = entry_end
+
+
+def _iter_text(data, start, end, dir, file, level, loggers):
+    names = prefixes = None
+    if loggers is not None:
+        names = set(name.encode() for name in loggers)
+        prefixes = tuple(name + b'.' for name in names)
+    match = levelno = None
+    for next_match in _header_re.finditer(data, start, end):
+        if match:
+            yield _make_record(data, match, levelno, next_match.start(), dir, file)
+        match = next_match
+        levelno = _levels.get(match.group(3))
+        if levelno is None:
+            levelno = _parse_level(match.group(3))
+        if levelno is None or levelno < level:
+            match = None
+        elif names is not None:
+            name = match.group(4)
+            if name not in names and not name.startswith(prefixes):
+                match = None
+    if match:
+        yield _make_record(data, match, levelno, end, dir, file)
+
+
+def _parse_level(name):
+    if name[:1] == b'l' and name[1:].isdigit():
+        return int(name[1:])
+
+
+def _make_record(data, match, levelno, end, dir, file):
+    message = data[match.end():end]
+    if message.endswith(b'\n'):
+        message = message[:-1]
+    time = int(match.group(1)) * 60 + float(match.group(2))
+    return Record(dir, file, time, levelno, match.group(4).decode(), message.decode('utf-8', 'replace'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pytest_logger.reader',
+                                     description='Renders pytest-logger logs as text.')
+    parser.add_argument('path', help='logs directory, archive or log file')
+    parser.add_argument('--level', type=int, default=logging.NOTSET, help='skips records below level')
+    parser.add_argument('--logger', action='append', dest='loggers', help='shows only records of logger')
+    args = parser.parse_args(argv)
+    single = os.path.isfile(args.path) and not os.path.exists(args.path + '.idx')
+    location = None
+    for record in iter_records(args.path, args.level, args.loggers):
+        if not single and (record.dir, record.file) != location:
+            location = record.dir, record.file
+            print('==> %s/%s <==' % location)
+        print(format_record(record))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Micro-benchmarks of plugin's hot paths.
+
+They check that benchmarked code works, figures are printed when run with ``-s``::
+
+    py.test -s tests/test_benchmarks.py
+
+Benchmarks scaling with number of test items run for 1000 items,
+others sizes can be given in environment variable::
+
+    PYTEST_LOGGER_BENCH_SIZES=1000,10000,100000 py.test -s tests/test_benchmarks.py
+"""
+import os
+import re
+import sys
+import time
+import subprocess
+import types
+import logging
+import pytest
+import pytest_logger.plugin as plugin
+
+SIZES = [int(size) for size in os.environ.get('PYTEST_LOGGER_BENCH_SIZES', '1000').split(',')]
+
+
+def bench(label, func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    elapsed = time.perf_counter() - start
+    sys.stdout.write('\n%s: %.2f us/op' % (label, elapsed / number * 1e6))
+    return elapsed
+
+
+def bench_total(label, func, size):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    sys.stdout.write('\n%s, %s items: %.3f s, %.2f us/item' % (label, size, elapsed, elapsed / size * 1e6))
+    return result
+
+
+@pytest.fixture
+def logger_plugin(pytestconfig, tmp_path):
+    logcfg = plugin.LoggerConfig()
+    logcfg.split_by_outcome()
+    logger_plugin = plugin.LoggerPlugin(pytestconfig, logcfg)
+    logger_plugin._logsdir = tmp_path / 'logs'
+    yield logger_plugin
+    logger_plugin.pytest_unconfigure(pytestconfig)
+
+
+def make_items(logger_plugin, size):
+    config = types.SimpleNamespace(option=types.SimpleNamespace(capture='fd'),
+                                   pluginmanager=types.SimpleNamespace(getplugin=lambda name: logger_plugin))
+    return [types.SimpleNamespace(nodeid='tests/test_module.py::TestClass::test_param[%s-a/b]' % i, config=config)
+            for i in range(size)]
+
+
+def test_bench_handlers_setup_teardown(tmp_path):
+    stdoutloggers = [('foo', logging.WARN), ('bar', logging.NOTSET)]
+    fileloggers = [('foo', logging.NOTSET), ('bar', logging.INFO), ('baz', logging.NOTSET)]
+    pool = plugin._HandlerPool(plugin.DefaultFormatter())
+
+    def per_item(pool):
+        if pool:
+            formatter = pool.restart_formatter()
+            handlers = plugin._make_stdout_handlers(stdoutloggers, formatter, pool.get_stdout_handler)
+            handlers += plugin._make_file_handlers(fileloggers, formatter, tmp_path, pool.get_file_handler)
+        else:
+            formatter = plugin.DefaultFormatter()
+            handlers = plugin._make_stdout_handlers(stdoutloggers, formatter)
+            handlers += plugin._make_file_handlers(fileloggers, formatter, tmp_path)
+        plugin._enable(handlers)
+        plugin._disable(handlers)
+        if pool:
+            pool.put(handlers)
+        else:
+            plugin._close(handlers)
+
+    bench('setup/teardown per item, fresh handlers', lambda: per_item(None), 2000)
+    bench('setup/teardown per item, pooled handlers', lambda: per_item(pool), 2000)
+
+    assert len(pool._stdout_handlers) == len(stdoutloggers)
+    assert len(pool._file_handlers) == len(fileloggers)
+    pool.close()
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bench_logger_state(logger_plugin, size):
+    stdoutloggers = [('foo', logging.WARN)]
+    fileloggers = [('foo', logging.NOTSET), ('bar', logging.INFO)]
+    items = make_items(logger_plugin, size)
+
+    def run_items():
+        for item in items:
+            state = plugin.LoggerState(item, stdoutloggers, fileloggers, plugin.DefaultFormatter(), logger_plugin)
+            state.on_setup()
+            logging.getLogger('bar').info('this is info')
+            state.on_makereport()
+
+    bench_total('LoggerState setup/teardown', run_items, size)
+    assert len(os.listdir(str(logger_plugin._logsdir / 'tests/test_module.py/TestClass'))) == size
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bench_file_write(tmp_path, size):
+    logger = logging.getLogger('bench')
+    record = logging.LogRecord('bench', logging.INFO, __file__, 1, 'message %s: %d', ('arg', 5), None)
+    variants = [
+        ('unbuffered', plugin._FileHandler),
+        ('buffered', lambda filename: plugin._FileHandler(filename, buffer_size=65536)),
+    ]
+    for label, new_handler in variants:
+        handlers = plugin._make_file_handlers([('bench', logging.NOTSET)], plugin.DefaultFormatter(),
+                                              tmp_path / label, new_handler)
+        (tmp_path / label).mkdir()
+
+        def write():
+            for _ in range(size):
+                logger.handle(record)
+
+        plugin._enable(handlers)
+        try:
+            bench_total('file write, %s' % label, write, size)
+        finally:
+            plugin._disable(handlers)
+            plugin._close(handlers)
+        lines = (tmp_path / label / 'bench').read_text().splitlines()
+        assert len(lines) == size
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('threads', (0, 4))
+def test_bench_split_by_outcome_links(logger_plugin, size, threads):
+    items = make_items(logger_plugin, size)
+    links = sorted(('failed', plugin._item_nodepath(item)) for item in items)
+    bench_total('split by outcome links, %s threads' % threads,
+                lambda: logger_plugin._make_outcome_links(links, threads), size)
+    assert len(os.listdir(str(logger_plugin._logsdir / 'by_outcome/failed/tests/test_module.py/TestClass'))) == size
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bench_default_formatter(size):
+    number = size * 10
+    record = logging.LogRecord('foo.bar', logging.INFO, __file__, 1, 'message %s: %d', ('arg', 5), None)
+    formatters = [
+        ('DefaultFormatter', plugin.DefaultFormatter()),
+        ('DefaultFormatter generic path', plugin.DefaultFormatter()),
+        ('logging.Formatter', logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')),
+    ]
+    formatters[1][1]._fast = False
+
+    for label, formatter in formatters:
+        elapsed = bench('format, %s' % label, lambda: formatter.format(record), number)
+        sys.stdout.write(', %d records/s' % (number / elapsed))
+
+    assert formatters[0][1].format(record) == formatters[1][1].format(record)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bench_sanitize_nodeid(size):
+    def sanitize_nodeid_uncompiled(node_id):
+        tokens = node_id.split('::')
+        tokens[-1] = tokens[-1].replace('/', '-')
+        tokens[-1] = re.sub(r'-+', '-', tokens[-1])
+        node_id = '/'.join([x for x in tokens if x != '()'])
+        node_id = re.sub(r'\[(.+)\]', r'-\1', node_id)
+        return node_id
+
+    class Item:
+        def __init__(self, nodeid):
+            self.nodeid = nodeid
+
+    number = size
+    items = [Item('tests/unit/test_module.py::TestClass::test_param[%s-a/b-%s]' % (i, i * 7))
+             for i in range(number)]
+
+    def sanitize_all(sanitize):
+        start = time.perf_counter()
+        paths = [sanitize(item) for item in items]
+        sys.stdout.write('\n%s over %s items: %.3f s' % (sanitize.__name__, number, time.perf_counter() - start))
+        return paths
+
+    def uncompiled(item):
+        return sanitize_nodeid_uncompiled(item.nodeid)
+
+    def compiled(item):
+        return plugin._sanitize_nodeid(item.nodeid)
+
+    def memoized(item):
+        return plugin._item_nodepath(item)
+
+    expected = sanitize_all(uncompiled)
+    assert sanitize_all(compiled) == expected
+    assert sanitize_all(memoized) == expected
+    assert sanitize_all(memoized) == expected
+
+
+def test_bench_startup():
+    code = (
+        'import sys, time, pytest\n'
+        'before = set(sys.modules)\n'
+        'start = time.perf_counter()\n'
+        'import pytest_logger.plugin\n'
+        'print(time.perf_counter() - start)\n'
+        'print(" ".join(sorted(set(sys.modules) - before)))\n'
+        'print(" ".join(sorted(sys.modules)))\n'
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True).splitlines()
+    elapsed, imported, modules = output
+    sys.stdout.write('\nimport after pytest: %.2f ms, imports: %s' % (float(elapsed) * 1e3, imported))
+    # modules of optional features are imported lazily
+    lazy = {'gzip', 'queue', 'concurrent.futures', 'logging.handlers', 'zstandard'}
+    assert not lazy & set(modules.split())
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bench_log_option_parser(size):
+    logcfg = plugin.LoggerConfig()
+    for index in range(size // 10):
+        logcfg.add_loggers(['logger%s.%s' % (index, sub) for sub in range(10)])
+    option = ','.join('logger%s.%s.info' % (index, index % 10) for index in range(0, size // 10, 10))
+
+    def parse():
+        parser = plugin._log_option_parser(logcfg._loggers, logcfg._index)
+        return plugin._loggers_from_logcfg(logcfg, parser(option))
+
+    loggers = bench_total('loggers option parsing', parse, size)
+    assert len(loggers.stdout) == len(option.split(','))
+    assert len(loggers.file) == size // 10 * 10
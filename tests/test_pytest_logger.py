@@ -1,4 +1,8 @@
 import os
+import io
+import gzip
+import json
+import importlib.util
 import pytest
 import textwrap
 from pathlib import Path
@@ -47,6 +51,17 @@ def test_case_py(pytester):
     """)
 
 
+def decompress(data: bytes, compression):
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+
+
+compressions = ('gzip', pytest.param('zstd', marks=pytest.mark.skipif(
+    not importlib.util.find_spec('zstandard'), reason='zstd compression requires "zstandard" package')))
+
+
 class FileLineMatcher(LineMatcher):
     def __init__(self, path: Path):
         super().__init__(path.read_text().splitlines())
@@ -198,7 +213,255 @@ def test_file_handlers(pytester, conftest_py, test_case_py):
     ])
 
 
-def test_split_logs_by_outcome(pytester):
+def test_async_file_handlers(pytester, conftest_py, test_case_py):
+    makefile('conftest.py', conftest_py.read_text() + textwrap.dedent("""
+        def pytest_logger_config(logger_config):
+            logger_config.set_async_file_handlers()
+    """))
+    makefile('test_case.py', test_case_py.read_text() + textwrap.dedent("""
+        import threading
+        def test_no_writes_in_test_thread():
+            names = [t.name for t in threading.enumerate()]
+            assert 'pytest-logger-writer' in names
+            logging.getLogger('foo').warning('arg: %s', names)
+    """))
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    assert ls(BASETEMP / 'logs/test_case.py') == ['test_case', 'test_no_writes_in_test_thread']
+    assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar', 'foo']
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/foo').fnmatch_lines([
+        '* foo: this is error',
+        '* foo: this is warning',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/bar').fnmatch_lines([
+        '* bar: this is error',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_no_writes_in_test_thread/foo').fnmatch_lines([
+        "* foo: arg: [[]*'pytest-logger-writer'*[]]",
+    ])
+
+
+@pytest.fixture
+def unopenable_file_case(pytester):
+    makefile('conftest.py', """
+        def pytest_logger_fileloggers(item):
+            return ['foo', 'x' * 300]
+    """)
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            logging.getLogger('x' * 300).warning('this is lost')
+            logging.getLogger('foo').warning('this is warning')
+    """)
+
+
+def test_async_file_handlers_unopenable_file(pytester, unopenable_file_case):
+    makefile('conftest.py', Path('conftest.py').read_text() + textwrap.dedent("""
+        def pytest_logger_config(logger_config):
+            logger_config.set_async_file_handlers()
+    """))
+
+    result = pytester.runpytest_subprocess('-s', '--logger-logsdir=%s' % LOGSDIR, timeout=60)
+    assert result.ret == 0
+    result.stderr.fnmatch_lines([
+        '--- Logging error ---',
+        '*File name too long*',
+    ])
+    FileLineMatcher(LOGSDIR / 'test_case.py/test_case/foo').fnmatch_lines([
+        '* foo: this is warning',
+    ])
+
+
+def test_handler_pooling(pytester):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_stdoutloggers(item):
+            return ['foo']
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+        def pytest_logger_config(logger_config):
+            logger_config.set_handler_pooling()
+    """)
+    makefile('test_case.py', """
+        import logging
+        handlers = set()
+
+        def log_and_collect(index):
+            for lgr in (logging.getLogger(name) for name in ['foo', 'bar']):
+                lgr.error('this is error %s', index)
+                lgr.warning('this is warning %s', index)
+                handlers.update(lgr.handlers)
+
+        def test_first():
+            log_and_collect(1)
+
+        def test_second():
+            log_and_collect(2)
+
+        def test_handlers_reused():
+            log_and_collect(3)
+            assert len(handlers) == 3
+    """)
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        '* foo: this is error 1',
+        '* foo: this is warning 1',
+        '* foo: this is error 2',
+        '* foo: this is warning 2',
+    ])
+
+    for index, test in enumerate(['test_first', 'test_second', 'test_handlers_reused'], 1):
+        assert ls(BASETEMP / f'logs/test_case.py/{test}') == ['bar', 'foo']
+        FileLineMatcher(BASETEMP / f'logs/test_case.py/{test}/foo').fnmatch_lines([
+            f'00:00.* foo: this is error {index}',
+            f'00:00.* foo: this is warning {index}',
+        ])
+        assert (BASETEMP / f'logs/test_case.py/{test}/bar').read_text().count('\n') == 1
+
+
+@pytest.mark.parametrize('use_hooks', (False, True))
+def test_handler_dispatch(pytester, use_hooks):
+    if use_hooks:
+        makefile('conftest.py', """
+            import logging
+            def pytest_logger_stdoutloggers(item):
+                return ['foo']
+            def pytest_logger_fileloggers(item):
+                return ['foo', ('bar', logging.ERROR)]
+            def pytest_logger_config(logger_config):
+                logger_config.set_handler_dispatch()
+        """)
+    else:
+        makefile('conftest.py', """
+            def pytest_logger_config(logger_config):
+                logger_config.add_loggers(['foo'], stdout_level='warning')
+                logger_config.add_loggers(['bar'], file_level='error')
+                logger_config.set_log_option_default('foo')
+                logger_config.set_handler_dispatch()
+        """)
+    makefile('test_case.py', """
+        import logging
+        handlers = set()
+
+        def log_and_collect(index):
+            for lgr in (logging.getLogger(name) for name in ['foo', 'bar']):
+                lgr.error('this is error %s', index)
+                lgr.warning('this is warning %s', index)
+                handlers.update(lgr.handlers)
+
+        def test_first():
+            log_and_collect(1)
+
+        def test_second():
+            log_and_collect(2)
+            assert len(handlers) == 2
+    """)
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        '* foo: this is error 1',
+        '* foo: this is warning 1',
+        '* foo: this is error 2',
+        '* foo: this is warning 2',
+    ])
+
+    for index, test in enumerate(['test_first', 'test_second'], 1):
+        assert ls(BASETEMP / f'logs/test_case.py/{test}') == ['bar', 'foo']
+        FileLineMatcher(BASETEMP / f'logs/test_case.py/{test}/foo').fnmatch_lines([
+            f'* foo: this is error {index}',
+            f'* foo: this is warning {index}',
+        ])
+        FileLineMatcher(BASETEMP / f'logs/test_case.py/{test}/bar').fnmatch_lines([
+            f'* bar: this is error {index}',
+        ])
+
+
+@pytest.mark.parametrize('compression', compressions)
+def test_file_compression(pytester, conftest_py, test_case_py, compression):
+    makefile('conftest.py', conftest_py.read_text() + textwrap.dedent("""
+        def pytest_logger_config(logger_config):
+            logger_config.set_file_compression(%r)
+    """ % compression))
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    suffix = {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar' + suffix, 'foo' + suffix]
+
+    def read(name):
+        return decompress((BASETEMP / 'logs/test_case.py/test_case' / name).read_bytes(), compression).decode()
+
+    LineMatcher(read('foo' + suffix).splitlines()).fnmatch_lines([
+        '* foo: this is error',
+        '* foo: this is warning',
+    ])
+    LineMatcher(read('bar' + suffix).splitlines()).fnmatch_lines([
+        '* bar: this is error',
+    ])
+
+
+def test_file_compression_unopenable_file(pytester, unopenable_file_case):
+    makefile('conftest.py', Path('conftest.py').read_text() + textwrap.dedent("""
+        def pytest_logger_config(logger_config):
+            logger_config.set_file_compression('gzip')
+    """))
+
+    result = pytester.runpytest_subprocess('-s', '--logger-logsdir=%s' % LOGSDIR, timeout=60)
+    assert result.ret == 0
+    result.stderr.fnmatch_lines([
+        '--- Logging error ---',
+        '*File name too long*',
+    ])
+    LineMatcher(gzip.open(LOGSDIR / 'test_case.py/test_case/foo.gz', 'rt').read().splitlines()).fnmatch_lines([
+        '* foo: this is warning',
+    ])
+
+
+def test_lazy_logdirs(pytester, conftest_py, test_case_py):
+    makefile('conftest.py', conftest_py.read_text() + textwrap.dedent("""
+        def pytest_logger_config(logger_config):
+            logger_config.set_lazy_logdirs()
+            logger_config.split_by_outcome(outcomes=['passed'])
+    """))
+    makefile('test_case.py', test_case_py.read_text() + textwrap.dedent("""
+        def test_silent():
+            logging.getLogger('foo').debug('this is filtered out by root logger')
+
+        def test_silent_with_logdir(logdir):
+            pass
+
+        class TestClass:
+            def test_silent(self):
+                pass
+
+            def test_errors_only(self):
+                logging.getLogger('bar').error('this is error')
+    """))
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    assert ls(BASETEMP / 'logs/test_case.py') == ['TestClass', 'test_case', 'test_silent_with_logdir']
+    assert ls(BASETEMP / 'logs/test_case.py/test_silent_with_logdir') == []
+    assert ls(BASETEMP / 'logs/test_case.py/TestClass') == ['test_errors_only']
+    assert ls(BASETEMP / 'logs/test_case.py/TestClass/test_errors_only') == ['bar']
+    assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar', 'foo']
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/foo').fnmatch_lines([
+        '* foo: this is error',
+        '* foo: this is warning',
+    ])
+    assert outcome_links('passed') == ['TestClass', 'test_case', 'test_silent_with_logdir']
+    assert ls(BASETEMP / 'logs/by_outcome/passed/test_case.py/TestClass') == ['test_errors_only']
+
+
+@pytest.mark.parametrize('split_args', ('', ', deferred=True', ', deferred=True, threads=2'))
+def test_split_logs_by_outcome(pytester, split_args):
     makefile('conftest.py', """
         import logging
         def pytest_logger_fileloggers(item):
@@ -208,8 +471,8 @@ def test_split_logs_by_outcome(pytester):
             ]
 
         def pytest_logger_config(logger_config):
-            logger_config.split_by_outcome(outcomes=['passed', 'failed'])
-    """)
+            logger_config.split_by_outcome(outcomes=['passed', 'failed']%s)
+    """ % split_args)
     makefile('test_case.py', """
         import pytest
         import logging
@@ -249,6 +512,593 @@ def test_split_logs_by_outcome(pytester):
     assert os.readlink(str(passedlogpath)) == passedlogdest
 
 
+def outcome_links(outcome):
+    """Tests linked in split by outcome directory, whose links must lead to test directories."""
+    path = BASETEMP / 'logs/by_outcome' / outcome / 'test_case.py'
+    if not path.exists():
+        return []
+    links = ls(path)
+    assert all(os.path.isdir(path / link) for link in links)
+    return links
+
+
+@pytest.mark.parametrize('config, failed, passed', [
+    # failing tests pass setup and teardown, so they are linked as passed too
+    ('keep_logs_by_outcome()', ['test_case_1', 'test_case_2'], ['test_case_1', 'test_case_2']),
+    ('set_archive()', [], []),
+    ('set_lazy_logdirs()', ['test_case_1', 'test_case_2'], ['test_case_1', 'test_case_2', 'test_case_passes']),
+])
+def test_split_logs_by_outcome_first_test_fails(pytester, config, failed, passed):
+    makefile('conftest.py', """
+        def pytest_logger_fileloggers(item):
+            return ['foo']
+
+        def pytest_logger_config(logger_config):
+            logger_config.split_by_outcome(outcomes=['passed', 'failed'])
+            logger_config.%s
+    """ % config)
+    makefile('test_case.py', """
+        import logging
+        def test_case_1():
+            logging.getLogger('foo').warning('this is warning')
+            assert 0
+
+        def test_case_2():
+            logging.getLogger('foo').warning('this is warning')
+            assert 0
+
+        def test_case_passes():
+            logging.getLogger('foo').warning('this is warning')
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret != 0
+
+    assert outcome_links('failed') == failed
+    assert outcome_links('passed') == passed
+
+
+def test_keep_logs_by_outcome(pytester):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+
+        def pytest_logger_config(logger_config):
+            logger_config.keep_logs_by_outcome(capacity=3)
+    """)
+    makefile('test_case.py', """
+        import pytest
+        import logging
+        def log():
+            for lgr in (logging.getLogger(name) for name in ['foo', 'bar', 'baz']):
+                for index in range(5):
+                    lgr.error('this is error %s', index)
+            logging.getLogger('foo').warning('this is warning')
+
+        def test_case_that_fails():
+            log()
+            pytest.fail('just checking')
+
+        def test_case_that_passes():
+            log()
+
+        def test_case_that_uses_logdir(logdir):
+            log()
+
+        @pytest.fixture
+        def failing_teardown():
+            yield
+            log()
+            raise Exception('teardown fails')
+
+        def test_case_that_fails_in_teardown(failing_teardown):
+            pass
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret != 0
+
+    assert ls(BASETEMP / 'logs/test_case.py') == ['test_case_that_fails', 'test_case_that_fails_in_teardown',
+                                                  'test_case_that_uses_logdir']
+    for test in ['test_case_that_fails', 'test_case_that_fails_in_teardown', 'test_case_that_uses_logdir']:
+        assert ls(BASETEMP / f'logs/test_case.py/{test}') == ['bar', 'foo']
+        FileLineMatcher(BASETEMP / f'logs/test_case.py/{test}/foo').fnmatch_lines([
+            '(3 earlier logs dropped)',
+            '* foo: this is error 3',
+            '* foo: this is error 4',
+            '* foo: this is warning',
+        ])
+        FileLineMatcher(BASETEMP / f'logs/test_case.py/{test}/bar').fnmatch_lines([
+            '(2 earlier logs dropped)',
+            '* bar: this is error 2',
+            '* bar: this is error 3',
+            '* bar: this is error 4',
+        ])
+
+
+@pytest.mark.parametrize('keep_args', ('', 'deferred_formatting=True'))
+def test_keep_logs_by_outcome_releases_buffers(pytester, keep_args):
+    makefile('conftest.py', """
+        import pytest
+        import logging
+
+        handlers = []
+
+        def pytest_logger_fileloggers(item):
+            return ['foo']
+
+        def pytest_logger_config(logger_config):
+            logger_config.keep_logs_by_outcome(%s)
+
+        @pytest.fixture(autouse=True)
+        def collect_handlers(request):
+            handlers.extend(request.node._logger.handlers)
+
+        def pytest_sessionfinish(session):
+            print('handlers: %%s, kept: %%s, buffered: %%s' %% (
+                len(handlers), sum(len(item._logger.handlers) for item in session.items),
+                sum(len(hdlr._lines) for hdlr in handlers)))
+    """ % keep_args)
+    makefile('test_case.py', """
+        import pytest
+        import logging
+
+        @pytest.mark.parametrize('index', range(3))
+        def test_case(index):
+            for _ in range(10):
+                try:
+                    raise ValueError(index)
+                except ValueError:
+                    logging.getLogger('foo').exception('this is error with %s', [index])
+            assert index
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret != 0
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines([
+        '*handlers: 3, kept: 0, buffered: 0',
+    ])
+    assert ls(BASETEMP / 'logs/test_case.py') == ['test_case-0']
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case-0/foo').fnmatch_lines([
+        '* foo: this is error with ?0?',  # '?' matches brackets
+        'Traceback (most recent call last):',
+        '*',
+        'ValueError: 0',
+    ])
+
+
+def test_keep_logs_by_outcome_deferred_formatting(pytester):
+    makefile('conftest.py', """
+        import logging
+        from pytest_logger.plugin import DefaultFormatter
+
+        class CountingFormatter(DefaultFormatter):
+            formatted = 0
+            def format(self, record):
+                CountingFormatter.formatted += 1
+                return DefaultFormatter.format(self, record)
+
+        def pytest_logger_fileloggers(item):
+            return ['foo']
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_formatter_class(CountingFormatter)
+            logger_config.keep_logs_by_outcome(deferred_formatting=True)
+    """)
+    makefile('test_case.py', """
+        import pytest
+        import logging
+        from conftest import CountingFormatter
+
+        def test_case_that_fails():
+            items = ['a']
+            logging.getLogger('foo').warning('items: %s, %d, %s', items, 1, 'x')
+            items.append('b')
+            state = {'step': 1}
+            logging.getLogger('foo').warning(state)
+            state['step'] = 2
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logging.getLogger('foo').exception('this is error')
+            pytest.fail('just checking')
+
+        def test_case_that_passes():
+            logging.getLogger('foo').warning('this is %s', 'warning')
+
+        def test_case_that_uses_logdir(logdir):
+            logging.getLogger('foo').warning('this is %s', 'warning')
+
+        def test_case_that_is_not_formatted():
+            formatted = CountingFormatter.formatted
+            logging.getLogger('foo').warning('this is %s', 'warning')
+            assert CountingFormatter.formatted == formatted
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret != 0
+    result.assert_outcomes(passed=3, failed=1)
+
+    assert ls(BASETEMP / 'logs/test_case.py') == ['test_case_that_fails', 'test_case_that_uses_logdir']
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case_that_fails/foo').fnmatch_lines([
+        "* foo: items: ?'a'?, 1, x",  # '?' matches brackets
+        "* foo: {'step': 1}",
+        '* foo: this is error',
+        'Traceback (most recent call last):',
+        '*',
+        'ZeroDivisionError: division by zero',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case_that_uses_logdir/foo').fnmatch_lines([
+        '* foo: this is warning',
+    ])
+
+
+@pytest.mark.parametrize('pooling', (False, True))
+def test_records_formatted_once(pytester, pooling):
+    makefile('conftest.py', """
+        import pytest
+        import logging
+        from pytest_logger.plugin import DefaultFormatter
+
+        formatters = []
+
+        class CountingFormatter(DefaultFormatter):
+            formatted = 0
+            def format(self, record):
+                CountingFormatter.formatted += 1
+                return DefaultFormatter.format(self, record)
+
+        def pytest_logger_stdoutloggers(item):
+            return ['foo']
+
+        def pytest_logger_fileloggers(item):
+            return ['foo', 'foo.bar']
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_formatter_class(CountingFormatter)
+            logger_config.set_handler_pooling(%r)
+
+        @pytest.fixture(autouse=True)
+        def collect_formatter(request):
+            formatters.append(request.node._logger.handlers[0].formatter)
+
+        def pytest_sessionfinish(session):
+            print('last records: %%s' %% [formatter._last for formatter in formatters])
+    """ % pooling)
+    makefile('test_case.py', """
+        import logging
+        from conftest import CountingFormatter
+
+        def test_case():
+            logging.getLogger('foo').warning('this is warning')
+            logging.getLogger('foo.bar').warning('this is %s', 'warning')
+            logging.getLogger('foo.bar').warning('this is %s', 'warning')
+            assert CountingFormatter.formatted == 3
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logging.getLogger('foo.bar').exception('this is error')
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    result.stdout.fnmatch_lines([
+        '* wrn foo: this is warning',
+        '* wrn foo.bar: this is warning',
+        '* wrn foo.bar: this is warning',
+        '* err foo.bar: this is error',
+        '*last records: ?(None, None)?',  # '?' matches brackets
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/foo').fnmatch_lines([
+        '* wrn foo: this is warning',
+        '* wrn foo.bar: this is warning',
+        '* wrn foo.bar: this is warning',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/foo.bar').fnmatch_lines([
+        '* wrn foo.bar: this is warning',
+        '* wrn foo.bar: this is warning',
+    ])
+
+
+@pytest.mark.parametrize('xdist_args', ([], ['-n2']))
+def test_index_file(pytester, xdist_args):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_index_file()
+    """)
+    makefile('test_case.py', """
+        import pytest
+        import logging
+        def test_case_that_fails():
+            for lgr in (logging.getLogger(name) for name in ['foo', 'bar', 'baz']):
+                lgr.error('this is error')
+                lgr.warning('this is warning')
+            pytest.fail('just checking')
+
+        def test_case_that_passes():
+            logging.getLogger('foo').warning('this is warning')
+
+        def test_case_that_skips():
+            pytest.skip('not logging anything')
+    """)
+    result = pytester.runpytest('-s', *xdist_args)
+    assert result.ret != 0
+
+    lines = (BASETEMP / 'logs/index.jsonl').read_text().splitlines()
+    index = sorted((json.loads(line) for line in lines), key=lambda entry: entry['nodeid'])
+    for entry in index:
+        entry['files'].sort(key=lambda file: file['name'])
+        for file in entry['files']:
+            assert file.pop('bytes') > 0
+    assert index == [
+        {
+            'nodeid': 'test_case.py::test_case_that_fails',
+            'dir': 'test_case.py/test_case_that_fails',
+            'outcome': 'failed',
+            'files': [
+                {'name': 'bar', 'levels': {'ERROR': 1}},
+                {'name': 'foo', 'levels': {'ERROR': 1, 'WARNING': 1}},
+            ],
+        },
+        {
+            'nodeid': 'test_case.py::test_case_that_passes',
+            'dir': 'test_case.py/test_case_that_passes',
+            'outcome': 'passed',
+            'files': [
+                {'name': 'foo', 'levels': {'WARNING': 1}},
+            ],
+        },
+        {
+            'nodeid': 'test_case.py::test_case_that_skips',
+            'dir': 'test_case.py/test_case_that_skips',
+            'outcome': 'skipped',
+            'files': [],
+        },
+    ]
+
+
+@pytest.mark.parametrize('compression', (None,) + compressions)
+def test_archive(pytester, compression):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_archive()
+            if %r:
+                logger_config.set_file_compression(%r)
+    """ % (compression, compression))
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            logging.getLogger('foo').warning('this is warning')
+            logging.getLogger('bar').error('this is error')
+
+        def test_case_silent():
+            pass
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    suffix = {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+    assert ls(BASETEMP / 'logs') == ['logs.archive' + suffix, 'logs.archive%s.idx' % suffix]
+    data = (BASETEMP / 'logs' / ('logs.archive' + suffix)).read_bytes()
+    index = (BASETEMP / 'logs' / ('logs.archive%s.idx' % suffix)).read_text().splitlines()
+    index = [json.loads(line) for line in index]
+    assert [(entry['nodeid'], entry['dir'], entry['name']) for entry in index] == [
+        ('test_case.py::test_case', 'test_case.py/test_case', 'foo'),
+        ('test_case.py::test_case', 'test_case.py/test_case', 'bar'),
+    ]
+    contents = {}
+    for entry in index:
+        segment = data[entry['offset']:entry['offset'] + entry['length']]
+        if compression:
+            segment = decompress(segment, compression)
+        contents[entry['name']] = segment.decode().splitlines()
+    assert len(contents['foo']) == 1
+    assert contents['foo'][0].endswith(' foo: this is warning')
+    assert len(contents['bar']) == 1
+    assert contents['bar'][0].endswith(' bar: this is error')
+    # each segment is a gzip member or zstd frame, archive decompresses as a whole too
+    whole = decompress(data, compression) if compression else data
+    assert whole.decode().splitlines() == contents['foo'] + contents['bar']
+
+
+@pytest.mark.parametrize('options', ([], ['async'], ['gzip']))
+def test_archive_logdir_fixture(pytester, options):
+    makefile('conftest.py', """
+        def pytest_logger_fileloggers(item):
+            return ['foo']
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_archive()
+            logger_config.split_by_outcome(outcomes=['passed'])
+            if 'async' in %r:
+                logger_config.set_async_file_handlers()
+            if 'gzip' in %r:
+                logger_config.set_file_compression('gzip')
+    """ % (options, options))
+    makefile('test_case.py', """
+        import os
+        import pytest
+        import logging
+
+        @pytest.fixture
+        def logging_fixture():
+            logging.getLogger('foo').warning('this is logged before logdir')
+
+        def test_case(logging_fixture, logdir):
+            print('LOGDIR %s' % sorted(os.listdir(logdir)))
+            logging.getLogger('foo').warning('this is logged after logdir')
+
+        def test_case_archived():
+            logging.getLogger('foo').warning('this is archived')
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    suffix = '.gz' if 'gzip' in options else ''
+    result.stdout.fnmatch_lines([
+        "*LOGDIR ?'foo%s'?" % suffix,  # '?' matches brackets
+    ])
+    assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['foo' + suffix]
+    data = (BASETEMP / 'logs/test_case.py/test_case' / ('foo' + suffix)).read_bytes()
+    LineMatcher((gzip.decompress(data) if suffix else data).decode().splitlines()).fnmatch_lines([
+        '* foo: this is logged before logdir',
+        '* foo: this is logged after logdir',
+    ])
+    index = (BASETEMP / 'logs' / ('logs.archive%s.idx' % suffix)).read_text().splitlines()
+    assert [json.loads(line)['nodeid'] for line in index] == ['test_case.py::test_case_archived']
+    assert outcome_links('passed') == ['test_case']
+
+
+@pytest.mark.parametrize('options', ([], ['async'], ['gzip'], ['archive']))
+def test_binary_logs(pytester, options):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_binary_logs()
+            if 'async' in %r:
+                logger_config.set_async_file_handlers()
+            if 'gzip' in %r:
+                logger_config.set_file_compression()
+            if 'archive' in %r:
+                logger_config.set_archive()
+    """ % (options, options, options))
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            logging.getLogger('foo').warning('this is %s', 'warning')
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logging.getLogger('bar').exception('this is error')
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    if 'archive' in options:
+        assert ls(BASETEMP / 'logs') == ['logs.archive', 'logs.archive.idx']
+    elif 'gzip' in options:
+        assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar.bin.gz', 'foo.bin.gz']
+    else:
+        assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar.bin', 'foo.bin']
+
+    from pytest_logger.reader import iter_records
+    records = [(r.file, r.levelno, r.name, r.message.splitlines()) for r in iter_records(BASETEMP / 'logs')]
+    suffix = '.gz' if 'gzip' in options else ''
+    assert sorted(records)[1] == ('foo.bin' + suffix, 30, 'foo', ['this is warning'])
+    file, levelno, name, message = sorted(records)[0]
+    assert (file, levelno, name, message[:2]) == \
+        ('bar.bin' + suffix, 40, 'bar', ['this is error', 'Traceback (most recent call last):'])
+    assert message[-1] == 'ZeroDivisionError: division by zero'
+    assert len(records) == 2
+
+
+@pytest.mark.parametrize('binary', (False, True))
+def test_log_limits(pytester, binary):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_config(logger_config):
+            logger_config.add_loggers(['foo'], max_records=3)
+            logger_config.add_loggers(['bar', 'baz'])
+            logger_config.set_log_limits(max_bytes=%r, tail_size=%r)
+            logger_config.set_binary_logs(%r)
+    """ % ((1000, 150, binary) if binary else (406, 60, binary)))
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            for index in range(10):
+                logging.getLogger('foo').warning('message %s', index)
+            for index in range(10):
+                logging.getLogger('bar').warning('message %s', index)
+            for index in range(10):
+                logging.getLogger('baz').warning('message %s', index)
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    def lines(path):
+        return [line[10:] if line[0].isdigit() else line for line in path.read_text().splitlines()]  # no time
+
+    logdir = BASETEMP / 'logs/test_case.py/test_case'
+    if not binary:
+        assert lines(logdir / 'foo') == [
+            'wrn foo: message 0',
+            'wrn foo: message 1',
+            'wrn foo: message 2',
+            '(5 logs dropped)',
+            'wrn foo: message 8',
+            'wrn foo: message 9',
+        ]
+        # lines have 29 characters, 3 of foo and 10 of bar leave room in test's limit for 1 line of baz
+        assert len(lines(logdir / 'bar')) == 10
+        assert lines(logdir / 'baz') == [
+            'wrn baz: message 0',
+            '(7 logs dropped)',
+            'wrn baz: message 8',
+            'wrn baz: message 9',
+        ]
+    else:
+        from pytest_logger.reader import iter_records
+        messages = [(r.name, r.message) for r in iter_records(logdir / 'foo.bin')]
+        assert messages == [
+            ('foo', 'message 0'),
+            ('foo', 'message 1'),
+            ('foo', 'message 2'),
+            ('pytest_logger', '(4 logs dropped)'),
+            ('foo', 'message 7'),
+            ('foo', 'message 8'),
+            ('foo', 'message 9'),
+        ]
+
+
+@pytest.mark.parametrize('xdist_args', ([], ['-n2']))
+def test_logger_stats(pytester, xdist_args):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+    """)
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            for index in range(3):
+                logging.getLogger('foo').warning('this is warning')
+                logging.getLogger('bar').error('this is error')
+
+        def test_case_quiet():
+            logging.getLogger('foo').warning('this is warning')
+            logging.getLogger('bar').warning('this is warning')
+    """)
+    result = pytester.runpytest('-s', '--logger-stats=1', '--logger-stats-json=stats.json', *xdist_args)
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        '*= pytest-logger overhead =*',
+        'total *s: setup *s, emit *s, teardown *s',
+        'most expensive tests:',
+        '  *s test_case.py::test_case* (setup *s, emit *s, teardown *s, * records, * bytes)',
+        'most expensive loggers:',
+        '  *s * (* records emitted, * filtered)',
+    ])
+
+    stats = json.loads(Path('stats.json').read_text())
+    assert sorted(stats['tests']) == ['test_case.py::test_case', 'test_case.py::test_case_quiet']
+    assert stats['tests']['test_case.py::test_case']['records'] == 6
+    assert stats['tests']['test_case.py::test_case']['bytes'] > 0
+    assert stats['tests']['test_case.py::test_case_quiet']['records'] == 1
+    assert {name: (logger['emitted'], logger['filtered']) for name, logger in stats['loggers'].items()} == {
+        'foo': (4, 0),
+        'bar': (3, 1),
+    }
+
+
 def test_file_handlers_root(pytester):
     makefile('conftest.py', """
         import logging
@@ -499,6 +1349,39 @@ def test_xdist(pytester):
         FileLineMatcher(BASETEMP / logfilename).fnmatch_lines(['* wrn foo: this is test %s' % index])
 
 
+def test_xdist_logsdir(pytester):
+    N = 8
+    makefile('conftest.py', """
+        import os
+        def pytest_logger_fileloggers(item):
+            return ['foo']
+        def pytest_logger_logdirlink(config):
+            return os.path.join(os.path.dirname(__file__), 'logs')
+    """)
+    makefile(LOGSDIR / 'tmpfile', """
+        this shall be removed
+    """)
+    for index in range(N):
+        makefile(f'test_case{index}.py', f"""
+            import logging
+            def test_case{index}():
+                logging.getLogger('foo').warning('this is test {index}')
+        """)
+
+    result = pytester.runpytest('-n3', '-v', f'--logger-logsdir={LOGSDIR}')
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        'pytest-logger: 8 log files, * bytes written by 3 workers',
+    ])
+
+    assert os.readlink('logs') == str(LOGSDIR)
+    assert ls(LOGSDIR) == ['test_case%s.py' % i for i in range(N)]
+    for index in range(N):
+        FileLineMatcher(LOGSDIR / f'test_case{index}.py/test_case{index}/foo').fnmatch_lines([
+            '* wrn foo: this is test %s' % index,
+        ])
+
+
 def test_logsdir_option(pytester, conftest_py, test_case_py):
     result = pytester.runpytest('-s', f'--logger-logsdir={LOGSDIR}')
     assert result.ret == 0
@@ -521,6 +1404,38 @@ def test_logsdir_option(pytester, conftest_py, test_case_py):
     ])
 
 
+def test_logsdir_option_cleanup(pytester, conftest_py):
+    def run(name, *args):
+        makefile('test_case.py', """
+            import logging
+            def test_%s():
+                logging.getLogger('foo').warning('this is warning')
+        """ % name)
+        result = pytester.runpytest('-s', f'--logger-logsdir={LOGSDIR}', *args)
+        assert result.ret == 0
+
+    def logsdirs():
+        return [name for name in ls() if name.startswith(str(LOGSDIR))]
+
+    run('one')
+    run('two')
+    assert logsdirs() == ['myinilogs']
+    assert ls(LOGSDIR / 'test_case.py') == ['test_two']
+
+    run('three', '--logger-keep-runs=2')
+    run('four', '--logger-keep-runs=2')
+    run('five', '--logger-keep-runs=2')
+    assert logsdirs() == ['myinilogs', 'myinilogs.1', 'myinilogs.2']
+    assert ls(LOGSDIR / 'test_case.py') == ['test_five']
+    assert ls('myinilogs.1/test_case.py') == ['test_four']
+    assert ls('myinilogs.2/test_case.py') == ['test_three']
+
+    Path('myinilogs.removed-1-1').mkdir()  # left by interrupted session
+    run('six')
+    assert logsdirs() == ['myinilogs', 'myinilogs.1', 'myinilogs.2']
+    assert ls(LOGSDIR / 'test_case.py') == ['test_six']
+
+
 def test_logsdir_ini(pytester, conftest_py, test_case_py):
     makefile('pytest.ini', f"""
         [pytest]
@@ -616,6 +1531,43 @@ def test_logger_config(pytester, test_case_py):
     ])
 
 
+def test_logger_config_level_gating(pytester, test_case_py):
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_config(logger_config):
+            logger_config.add_loggers(['foo'], stdout_level='warning', file_level='info')
+            logger_config.add_loggers(['bar'], stdout_level='error', file_level='warning')
+            logger_config.set_log_option_default('foo,bar')
+            logger_config.set_level_gating()
+        def pytest_runtest_call(item):
+            enabled = [name for name in ['foo', 'bar', 'baz'] if logging.getLogger(name).isEnabledFor(logging.INFO)]
+            assert enabled == ['foo']
+    """)
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    result.stdout.fnmatch_lines([
+        '',
+        'test_case.py ',
+        '* err foo: this is error',
+        '* wrn foo: this is warning',
+        '* err bar: this is error',
+        '.',
+        '',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/foo').fnmatch_lines([
+        '* err foo: this is error',
+        '* wrn foo: this is warning',
+        '* inf foo: this is info',
+    ])
+    FileLineMatcher(BASETEMP / 'logs/test_case.py/test_case/bar').fnmatch_lines([
+        '* err bar: this is error',
+        '* wrn bar: this is warning',
+    ])
+    assert ls(BASETEMP / 'logs/test_case.py/test_case') == ['bar', 'foo']
+
+
 @pytest.mark.parametrize('log_option', ('', '--loggers=foo.info,baz'))
 def test_logger_config_option(pytester, test_case_py, log_option):
     makefile('conftest.py', """
@@ -647,6 +1599,79 @@ def test_logger_config_option(pytester, test_case_py, log_option):
         ])
 
 
+@pytest.mark.parametrize('scope, calls', [
+    (None, ['test_a.py::test_1', 'test_a.py::test_2', 'test_a.py::TestX::test_3', 'test_a.py::TestX::test_4',
+            'test_b.py::test_5']),
+    ('session', ['test_a.py::test_1']),
+    ('module', ['test_a.py::test_1', 'test_b.py::test_5']),
+    ('class', ['test_a.py::test_1', 'test_a.py::TestX::test_3', 'test_b.py::test_5']),
+])
+def test_hook_loggers_scope(pytester, scope, calls):
+    makefile('conftest.py', """
+        calls = []
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_hook_loggers_scope(%r)
+
+        def pytest_logger_fileloggers(item):
+            calls.append(item.nodeid)
+            return ['foo']
+
+        def pytest_sessionfinish(session):
+            print('calls: %%s' %% ' '.join(calls))
+    """ % scope)
+    test_case = """
+        import logging
+        def test_%s():
+            logging.getLogger('foo').warning('this is warning')
+    """
+    makefile('test_a.py', test_case % 1 + test_case % 2 + """
+        class TestX:
+            def test_3(self):
+                logging.getLogger('foo').warning('this is warning')
+
+            def test_4(self):
+                logging.getLogger('foo').warning('this is warning')
+    """)
+    makefile('test_b.py', test_case % 5)
+
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(['*calls: ' + ' '.join(calls)])
+    for path in ('test_a.py/test_1', 'test_a.py/test_2', 'test_a.py/TestX/test_3', 'test_b.py/test_5'):
+        FileLineMatcher(BASETEMP / 'logs' / path / 'foo').fnmatch_lines(['* wrn foo: this is warning'])
+
+
+def test_logger_config_option_wildcard(pytester):
+    makefile('conftest.py', """
+        def pytest_logger_config(logger_config):
+            logger_config.add_loggers(['app', 'app.db'], stdout_level='warning')
+            logger_config.add_loggers(['other'])
+    """)
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            logging.getLogger('app').warning('app warning')
+            logging.getLogger('app.db').info('db info')
+            logging.getLogger('app.db').warning('db warning')
+            logging.getLogger('other').warning('other warning')
+    """)
+
+    result = pytester.runpytest('-s', '--loggers=app.*,app.db.info')
+    assert result.ret == 0
+
+    result.stdout.fnmatch_lines([
+        '',
+        'test_case.py ',
+        '* wrn app: app warning',
+        '* inf app.db: db info',
+        '* wrn app.db: db warning',
+        '.',
+        '',
+    ])
+    assert 'other' not in result.stdout.str()
+
+
 @pytest.mark.parametrize('log_option', ('', '--loggers=foo.info,baz'))
 def test_logger_config_formatter(pytester, test_case_py, log_option):
     makefile('conftest.py', """
@@ -0,0 +1,131 @@
+import os
+import gzip
+import logging
+import textwrap
+import pytest
+from pathlib import Path
+from pytest_logger.reader import iter_records, Record
+
+
+def makefile(path, content: str):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(content).lstrip())
+    return path
+
+
+@pytest.fixture
+def logsdir(tmp_path):
+    makefile(tmp_path / 'index.jsonl', """
+        {"nodeid": "test_p.py::test_cat", "dir": "test_p.py/test_cat", "outcome": "failed", "files": []}
+    """)
+    makefile(tmp_path / 'test_p.py/test_cat/proc', """
+        00:00.001 inf proc: starting
+        00:01.250 err proc.child: failed: badly
+        Traceback (most recent call last):
+          File "x.py", line 1
+        ValueError: 1
+        01:02.003 l25 procfoo: custom level
+    """)
+    path = tmp_path / 'test_p.py/test_dog/proc.gz'
+    path.parent.mkdir(parents=True)
+    path.write_bytes(gzip.compress(b'00:00.000 wrn proc: woof\n'))
+    return tmp_path
+
+
+def test_iter_records(logsdir):
+    assert list(iter_records(logsdir)) == [
+        Record('test_p.py/test_cat', 'proc', 0.001, logging.INFO, 'proc', 'starting'),
+        Record('test_p.py/test_cat', 'proc', 1.25, logging.ERROR, 'proc.child',
+               'failed: badly\nTraceback (most recent call last):\n  File "x.py", line 1\nValueError: 1'),
+        Record('test_p.py/test_cat', 'proc', 62.003, 25, 'procfoo', 'custom level'),
+        Record('test_p.py/test_dog', 'proc.gz', 0.0, logging.WARNING, 'proc', 'woof'),
+    ]
+
+
+def test_iter_records_outcome_links(logsdir):
+    records = list(iter_records(logsdir))
+    (logsdir / 'by_outcome/failed/test_p.py').mkdir(parents=True)
+    os.symlink('../../../test_p.py/test_cat', str(logsdir / 'by_outcome/failed/test_p.py/test_cat'))
+    os.symlink('../../../test_p.py/test_cow', str(logsdir / 'by_outcome/failed/test_p.py/test_cow'))
+    assert list(iter_records(logsdir)) == records
+
+
+def test_iter_records_filters(logsdir):
+    assert [r.message for r in iter_records(logsdir, level=logging.WARNING)] == [
+        'failed: badly\nTraceback (most recent call last):\n  File "x.py", line 1\nValueError: 1',
+        'woof',
+    ]
+    assert [r.name for r in iter_records(logsdir, loggers=['proc'])] == ['proc', 'proc.child', 'proc']
+    assert [r.name for r in iter_records(logsdir, level=25, loggers=['procfoo'])] == ['procfoo']
+    assert [r.name for r in iter_records(logsdir / 'test_p.py/test_cat/proc', loggers=['proc.child'])] == \
+        ['proc.child']
+
+
+@pytest.mark.parametrize('compression', (None, 'gzip', 'zstd'))
+def test_iter_records_archive(pytester, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    makefile('conftest.py', """
+        import logging
+        def pytest_logger_fileloggers(item):
+            return ['foo', ('bar', logging.ERROR)]
+
+        def pytest_logger_config(logger_config):
+            logger_config.set_archive()
+            if %r:
+                logger_config.set_file_compression(%r)
+    """ % (compression, compression))
+    makefile('test_case.py', """
+        import logging
+        def test_case():
+            logging.getLogger('foo').warning('this is warning')
+            logging.getLogger('bar').error('this is error')
+
+        def test_case_silent():
+            pass
+    """)
+    result = pytester.runpytest('-s')
+    assert result.ret == 0
+
+    records = [(r.dir, r.file, r.levelno, r.name, r.message) for r in iter_records('../basetemp/logs')]
+    assert records == [
+        ('test_case.py/test_case', 'foo', logging.WARNING, 'foo', 'this is warning'),
+        ('test_case.py/test_case', 'bar', logging.ERROR, 'bar', 'this is error'),
+    ]
+
+
+def test_iter_records_zstd_frames(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    compressor = zstandard.ZstdCompressor()
+    path = tmp_path / 'proc.zst'
+    path.write_bytes(compressor.compress(b'00:00.001 inf proc: one\n') +
+                     compressor.compress(b'00:00.002 wrn proc: two\n'))
+    assert [r.message for r in iter_records(path)] == ['one', 'two']
+
+
+def test_render_binary_logs(tmp_path, capsys):
+    from pytest_logger.plugin import DefaultFormatter, _FileHandler
+    from pytest_logger.reader import main
+
+    formatter = DefaultFormatter()
+    records = []
+    for i, (name, level, created) in enumerate([('foo', logging.INFO, 0.0004996), ('foo.bar', 25, 61.0125),
+                                                ('foo', logging.ERROR, 3601.5)]):
+        record = logging.LogRecord(name, level, 'x.py', 1, 'message %s', (i,), None)
+        record.created = formatter._start + created
+        records.append(record)
+
+    text = logging.FileHandler(str(tmp_path / 'proc'))
+    binary = _FileHandler(str(tmp_path / 'proc'), binary=True)
+    for handler in (text, binary):
+        handler.setFormatter(formatter)
+        for record in records:
+            handler.handle(record)
+        handler.close()
+
+    main([str(tmp_path / 'proc.bin')])
+    assert capsys.readouterr().out == (tmp_path / 'proc').read_text()
+
+    main([str(tmp_path / 'proc.bin'), '--level=25', '--logger=foo.bar'])
+    assert capsys.readouterr().out == '01:01.012 l25 foo.bar: message 1\n'
@@ -1,4 +1,6 @@
+import sys
 import logging
+import threading
 import argparse
 import pytest
 import pytest_logger.plugin as plugin
@@ -65,6 +67,38 @@ def test_log_option_parser():
     assert str(e.value) == 'wrong logger, expected (a, b, c, d, e, f.g.h), got "alien.unknown"'
 
 
+def test_log_option_parser_wildcards():
+    loggers = [
+        (['a', 'a.b'], 20, 10),
+        (['a.b.c', 'f.g', 'a'], 30, 15),
+    ]
+
+    assert plugin._log_option_parser(loggers)('*') == [('a', 20), ('a.b', 20), ('a.b.c', 30), ('f.g', 30)]
+    assert plugin._log_option_parser(loggers)('a.*') == [('a', 20), ('a.b', 20), ('a.b.c', 30)]
+    assert plugin._log_option_parser(loggers)('a.b.*') == [('a.b', 20), ('a.b.c', 30)]
+    assert plugin._log_option_parser(loggers)('f.*.info') == [('f.g', logging.INFO)]
+    assert plugin._log_option_parser(loggers)('*.19,a.b') == [('a', 19), ('a.b', 19), ('a.b.c', 19), ('f.g', 19),
+                                                              ('a.b', 20)]
+
+    with pytest.raises(argparse.ArgumentTypeError) as e:
+        plugin._log_option_parser(loggers)('x.*')
+    assert str(e.value) == 'wrong logger, expected (a, a.b, a.b.c, f.g, a), got "x.*"'
+    with pytest.raises(argparse.ArgumentTypeError) as e:
+        plugin._log_option_parser(loggers)('a.*.unknown')
+    assert str(e.value) == 'wrong level, expected (INFO, warn, 15, ...), got "unknown"'
+
+
+def test_collapse_loggers():
+    loggers = [('x1', 20), ('x2', 30)]
+    assert plugin._collapse_loggers(loggers) == (loggers, {})
+
+    loggers = [('x1', 30), ('x1.y', 10), ('x1.y.z', 20), ('x1.y.z', 40), ('x1.w', 30), ('x2', 20)]
+    assert plugin._collapse_loggers(loggers) == ([('x1', 30), ('x1.y', 10), ('x2', 20)], {'x1.y': 30})
+
+    loggers = [('', 20), ('x1', 10), ('x1.y', 20)]
+    assert plugin._collapse_loggers(loggers) == ([('', 20), ('x1', 10)], {'x1': 20})
+
+
 def test_set_formatter_class():
     logcfg = plugin.LoggerConfig()
 
@@ -82,6 +116,82 @@ def test_set_formatter_class():
     assert str(e.value).startswith('issubclass() arg 1 must be a class')
 
 
+def test_default_formatter_fast_path():
+    def make_record(offset, level, msg, *args, exc_info=None):
+        record = logging.LogRecord('foo.bar', level, __file__, 1, msg, args, exc_info)
+        record.created = fast._start + offset
+        return record
+
+    fast = plugin.DefaultFormatter()
+    generic = plugin.DefaultFormatter()
+    generic._start = fast._start
+    generic._fast = False
+
+    try:
+        raise ValueError('bad value')
+    except ValueError:
+        exc_info = sys.exc_info()
+
+    records = [
+        (0, logging.INFO, 'plain'),
+        (0.0015, logging.WARN, 'args %s %d', 'x', 5),
+        (0.9999996, 35, 'unknown level'),
+        (1.0004, logging.DEBUG, 'next second'),
+        (61.25, logging.FATAL, 'minute'),
+        (3723.5, logging.ERROR, 'hour'),
+        (-0.001, logging.ERROR, 'before start'),
+    ]
+    for offset in [x / 1000.0 for x in range(0, 3000, 7)]:
+        records.append((offset, logging.INFO, 'offset %s', offset))
+    for args in records:
+        assert fast.format(make_record(*args)) == generic.format(make_record(*args))
+
+    assert fast.format(make_record(0.5, logging.ERROR, 'exc', exc_info=exc_info)) == \
+        generic.format(make_record(0.5, logging.ERROR, 'exc', exc_info=exc_info))
+    assert fast.format(make_record(12.3456, 35, 'this is 35')) == '00:12.345 l35 foo.bar: this is 35'
+
+    class CustomFormatString(plugin.DefaultFormatter):
+        def __init__(self):
+            plugin.DefaultFormatter.__init__(self)
+            logging.Formatter.__init__(self, '[%(levelshortname)s] %(asctime)s %(message)s')
+
+    class CustomFormatMessage(plugin.DefaultFormatter):
+        def formatMessage(self, record):
+            return '<%s>' % record.getMessage()
+
+    custom = CustomFormatString()
+    custom._start = fast._start
+    assert custom.format(make_record(1.5, logging.INFO, 'custom')) == '[inf] 00:01.500 custom'
+    custom = CustomFormatMessage()
+    assert custom.format(make_record(1.5, logging.INFO, 'custom')) == '<custom>'
+
+
+def test_default_formatter_threads():
+    formatter = plugin.DefaultFormatter()
+    errors = []
+
+    def format_records(offset, expected):
+        record = logging.LogRecord('a', logging.INFO, __file__, 1, 'm', (), None)
+        record.created = formatter._start + offset
+        for _ in range(20000):
+            text = formatter.format(record)
+            if text != expected:
+                errors.append(text)
+
+    threads = [threading.Thread(target=format_records, args=(1.5, '00:01.500 inf a: m')),
+               threading.Thread(target=format_records, args=(2.5, '00:02.500 inf a: m'))]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # makes threads interleave within format
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+
+
 def test_loggers_from_logcfg_empty():
     logcfg = plugin.LoggerConfig()
 
@@ -108,3 +218,101 @@ def test_split_by_outcome_wrong_config():
     logcfg = plugin.LoggerConfig()
     with pytest.raises(ValueError, match="got unexpected_outcomes: <\\['sthelese'\\]>"):
         logcfg.split_by_outcome(outcomes=['failed', 'sthelese'])
+    with pytest.raises(ValueError, match="got unexpected_outcomes: <\\['error'\\]>"):
+        logcfg.keep_logs_by_outcome(outcomes=['error'])
+
+
+def test_file_compression_wrong_config():
+    logcfg = plugin.LoggerConfig()
+    with pytest.raises(ValueError, match="got unexpected compression: <bz2>, expected one of: gzip, zstd"):
+        logcfg.set_file_compression('bz2')
+
+
+def test_hook_loggers_scope_wrong_config():
+    logcfg = plugin.LoggerConfig()
+    with pytest.raises(ValueError, match="got unexpected scope: <function>, expected one of: None, session, module"):
+        logcfg.set_hook_loggers_scope('function')
+
+
+@pytest.fixture
+def restore_levels():
+    names = ['', 'a', 'a.b', 'a.b.c', 'd', 'x', 'x.y', 'x.y.z']
+    levels = [(logging.getLogger(name), logging.getLogger(name).level) for name in names]
+    yield
+    for logger, level in levels:
+        logger.setLevel(level)
+
+
+def test_level_gate(restore_levels):
+    logging.root.setLevel(logging.WARN)
+    logging.getLogger('x').setLevel(logging.ERROR)
+    for name in ['a', 'a.b', 'a.b.c', 'd', 'x.y', 'x.y.z']:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+    gate = plugin.LevelGate(True, [('a', logging.WARN), ('a', logging.INFO), ('a.b', logging.DEBUG),
+                                   ('a.b.c', logging.FATAL), ('x.y', logging.NOTSET)])
+    gate.enable()
+    assert logging.root.level == logging.WARN
+    assert logging.getLogger('a').level == logging.INFO
+    assert logging.getLogger('a.b').level == logging.DEBUG
+    assert logging.getLogger('a.b.c').level == logging.DEBUG
+    assert logging.getLogger('x.y').level == logging.ERROR
+    assert not logging.getLogger('d').isEnabledFor(logging.INFO)
+    assert not logging.getLogger('x.y.z').isEnabledFor(logging.WARN)
+    assert logging.getLogger('a.b.c').isEnabledFor(logging.DEBUG)
+    gate.disable()
+    assert [logging.getLogger(name).level for name in ['', 'a', 'a.b', 'a.b.c', 'x', 'x.y']] == \
+        [logging.WARN, 0, 0, 0, logging.ERROR, 0]
+
+    gate = plugin.LevelGate(True, [('', logging.NOTSET), ('a', logging.WARN)])
+    gate.enable()
+    assert logging.root.level == 1
+    assert logging.getLogger('a').level == 1
+    gate.disable()
+    assert logging.root.level == logging.WARN
+    assert logging.getLogger('a').level == logging.NOTSET
+
+
+def test_buffered_file_handler(tmp_path):
+    def emit(level, msg):
+        handler.handle(logging.LogRecord('foo', level, __file__, 1, msg, None, None))
+
+    logfile = tmp_path / 'foo'
+    handler = plugin._FileHandler(str(logfile), buffer_size=1024)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+
+    emit(logging.INFO, 'one')
+    emit(logging.WARN, 'two')
+    assert logfile.read_text() == ''
+    emit(logging.ERROR, 'three')
+    assert logfile.read_text() == 'INFO one\nWARNING two\nERROR three\n'
+    emit(logging.INFO, 'x' * 2000)
+    assert len(logfile.read_text()) > 2000
+    emit(logging.INFO, 'four')
+    assert not logfile.read_text().endswith('four\n')
+    handler.detach()
+    assert logfile.read_text().endswith('four\n')
+
+    handler.retarget(str(tmp_path / 'bar'))
+    emit(logging.INFO, 'five')
+    handler.close()
+    assert (tmp_path / 'bar').read_text() == 'INFO five\n'
+
+
+def test_async_handler_prepare():
+    target = logging.Handler()
+    target.logger = logging.getLogger('foo')
+    handler = plugin._AsyncHandler(target, writer=None)
+    items = ['a']
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = logging.LogRecord('foo', logging.ERROR, __file__, 1, 'items: %s', (items,), sys.exc_info())
+    items.append('b')
+
+    prepared = handler.prepare(record)
+    assert prepared is not record
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ("items: ['a', 'b']", None, None)
+    assert prepared.exc_text.startswith('Traceback (most recent call last):')
+    assert prepared.exc_text.endswith('ZeroDivisionError: division by zero')
+    assert record.exc_info